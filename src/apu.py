@@ -0,0 +1,629 @@
+import math
+
+try:
+    import numpy
+except ImportError:
+    # without numpy the registers still behave, but no samples are made
+    numpy = None
+
+CPU_FREQUENCY = 1789773
+SAMPLE_RATE = 44100
+
+LENGTH_TABLE = [
+    10, 254, 20, 2, 40, 4, 80, 6, 160, 8, 60, 10, 14, 12, 26, 14,
+    12, 16, 24, 18, 48, 20, 96, 22, 192, 24, 72, 26, 16, 28, 32, 30
+]
+
+DUTY_TABLE = [
+    [0, 1, 0, 0, 0, 0, 0, 0],
+    [0, 1, 1, 0, 0, 0, 0, 0],
+    [0, 1, 1, 1, 1, 0, 0, 0],
+    [1, 0, 0, 1, 1, 1, 1, 1]
+]
+
+TRIANGLE_SEQUENCE = list(range(15, -1, -1)) + list(range(16))
+
+# in CPU cycles
+NOISE_PERIODS = [4, 8, 16, 32, 64, 96, 128, 160, 202, 254, 380, 508, 762, 1016, 2034, 4068]
+DMC_RATES = [428, 380, 340, 320, 286, 254, 226, 214, 190, 160, 142, 128, 106, 84, 72, 54]
+
+# nonlinear mixer, indexed by the sum of the pulse outputs and by 3 * triangle + 2 * noise + dmc
+PULSE_TABLE = [0.0] + [95.52 / (8128.0 / n + 100) for n in range(1, 31)]
+TND_TABLE = [0.0] + [163.67 / (24329.0 / n + 100) for n in range(1, 203)]
+
+
+def lfsr_sequence(tap: int) -> bytes:
+    """
+    output of the noise shift register at every step until it repeats, 1 where the channel sounds
+    tap 1 gives the long sequence (32767 steps), tap 6 the short one (93 steps)
+    """
+    shift = 1
+    output = bytearray()
+    while True:
+        output.append(0 if shift & 1 else 1)
+        feedback = (shift ^ (shift >> tap)) & 1
+        shift = (shift >> 1) | (feedback << 14)
+        if shift == 1:
+            return bytes(output)
+
+
+NOISE_SEQUENCES = [lfsr_sequence(1), lfsr_sequence(6)]
+
+
+class FrameStep:
+    QUARTER = 0b001
+    HALF = 0b010
+    IRQ = 0b100
+
+
+# CPU cycles after a $4017 write at which the frame counter clocks the channels, and the length of the sequence
+FOUR_STEP_SEQUENCE = [
+    (7457, FrameStep.QUARTER),
+    (14913, FrameStep.QUARTER | FrameStep.HALF),
+    (22371, FrameStep.QUARTER),
+    (29829, FrameStep.QUARTER | FrameStep.HALF | FrameStep.IRQ)
+]
+FOUR_STEP_PERIOD = 29830
+FIVE_STEP_SEQUENCE = [
+    (7457, FrameStep.QUARTER),
+    (14913, FrameStep.QUARTER | FrameStep.HALF),
+    (22371, FrameStep.QUARTER),
+    (37281, FrameStep.QUARTER | FrameStep.HALF)
+]
+FIVE_STEP_PERIOD = 37282
+
+
+class Envelope:
+    def __init__(self):
+        self.loop = False
+        self.constant_volume = False
+        self.volume = 0
+        self.start = False
+        self.divider = 0
+        self.decay = 0
+
+    def write(self, value: int):
+        self.loop = bool(value & 0x20)
+        self.constant_volume = bool(value & 0x10)
+        self.volume = value & 0x0F
+
+    def clock(self):
+        if self.start:
+            self.start = False
+            self.decay = 15
+            self.divider = self.volume
+        elif self.divider == 0:
+            self.divider = self.volume
+            if self.decay > 0:
+                self.decay -= 1
+            elif self.loop:
+                self.decay = 15
+        else:
+            self.divider -= 1
+
+    def output(self) -> int:
+        return self.volume if self.constant_volume else self.decay
+
+
+class Channel:
+    """
+    length counter and sequencer position shared by the pulse, triangle and noise channels
+
+    the sequencer isn't stepped cycle by cycle, its position (phase, in steps) is only brought forward
+    when something about the channel changes, see APU.advance
+    """
+
+    # steps before the sequencer repeats
+    SEQUENCE_LENGTH = 1
+
+    def __init__(self):
+        self.enabled = False
+        self.halt = False
+        self.length_counter = 0
+        self.timer_period = 0
+        self.phase = 0.0
+        self.phase_cycle = 0
+
+    def step_cycles(self) -> float:
+        """
+        CPU cycles per sequencer step, infinite while the sequencer is stopped
+        """
+        return math.inf
+
+    def advance(self, cycle: int):
+        self.phase += (cycle - self.phase_cycle) / self.step_cycles()
+        self.phase_cycle = cycle
+
+    def wrap_phase(self):
+        self.phase %= self.SEQUENCE_LENGTH
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+        if not enabled:
+            self.length_counter = 0
+
+    def load_length(self, index: int):
+        if self.enabled:
+            self.length_counter = LENGTH_TABLE[index]
+
+    def clock_quarter(self):
+        pass
+
+    def clock_half(self):
+        if not self.halt and self.length_counter > 0:
+            self.length_counter -= 1
+
+
+class Pulse(Channel):
+    SEQUENCE_LENGTH = 8
+
+    def __init__(self, ones_complement: bool):
+        super().__init__()
+        # pulse 1 negates its sweep with ones' complement, pulse 2 with two's complement
+        self.ones_complement = ones_complement
+        self.duty = 0
+        self.envelope = Envelope()
+
+        self.sweep_enabled = False
+        self.sweep_period = 0
+        self.sweep_negate = False
+        self.sweep_shift = 0
+        self.sweep_reload = False
+        self.sweep_divider = 0
+
+    def write(self, register: int, value: int):
+        if register == 0:
+            self.duty = value >> 6
+            self.halt = bool(value & 0x20)
+            self.envelope.write(value)
+        elif register == 1:
+            self.sweep_enabled = bool(value & 0x80)
+            self.sweep_period = (value >> 4) & 0x07
+            self.sweep_negate = bool(value & 0x08)
+            self.sweep_shift = value & 0x07
+            self.sweep_reload = True
+        elif register == 2:
+            self.timer_period = (self.timer_period & 0x700) | value
+        else:
+            self.timer_period = (self.timer_period & 0xFF) | ((value & 0x07) << 8)
+            self.load_length(value >> 3)
+            self.envelope.start = True
+            self.phase = 0.0
+
+    def step_cycles(self) -> float:
+        return 2 * (self.timer_period + 1)
+
+    def sweep_target(self) -> int:
+        change = self.timer_period >> self.sweep_shift
+        if not self.sweep_negate:
+            return self.timer_period + change
+
+        return self.timer_period - change - (1 if self.ones_complement else 0)
+
+    def output_volume(self) -> int:
+        if self.length_counter == 0 or self.timer_period < 8 or self.sweep_target() > 0x7FF:
+            return 0
+
+        return self.envelope.output()
+
+    def clock_quarter(self):
+        self.envelope.clock()
+
+    def clock_half(self):
+        super().clock_half()
+
+        if self.sweep_divider == 0 and self.sweep_enabled and self.sweep_shift > 0 \
+                and self.timer_period >= 8 and self.sweep_target() <= 0x7FF:
+            self.timer_period = max(self.sweep_target(), 0)
+
+        if self.sweep_divider == 0 or self.sweep_reload:
+            self.sweep_divider = self.sweep_period
+            self.sweep_reload = False
+        else:
+            self.sweep_divider -= 1
+
+
+class Triangle(Channel):
+    SEQUENCE_LENGTH = 32
+
+    def __init__(self):
+        super().__init__()
+        self.linear_counter = 0
+        self.linear_reload_value = 0
+        self.linear_reload = False
+
+    def write(self, register: int, value: int):
+        if register == 0:
+            self.halt = bool(value & 0x80)
+            self.linear_reload_value = value & 0x7F
+        elif register == 2:
+            self.timer_period = (self.timer_period & 0x700) | value
+        elif register == 3:
+            self.timer_period = (self.timer_period & 0xFF) | ((value & 0x07) << 8)
+            self.load_length(value >> 3)
+            self.linear_reload = True
+
+    def step_cycles(self) -> float:
+        # the sequencer holds its value while silenced, and for ultrasonic periods
+        if self.length_counter == 0 or self.linear_counter == 0 or self.timer_period < 2:
+            return math.inf
+
+        return self.timer_period + 1
+
+    def clock_quarter(self):
+        if self.linear_reload:
+            self.linear_counter = self.linear_reload_value
+        elif self.linear_counter > 0:
+            self.linear_counter -= 1
+
+        if not self.halt:
+            self.linear_reload = False
+
+
+class Noise(Channel):
+    SEQUENCE_LENGTH = len(NOISE_SEQUENCES[0]) * len(NOISE_SEQUENCES[1])
+
+    def __init__(self):
+        super().__init__()
+        self.timer_period = NOISE_PERIODS[0]
+        self.short_mode = False
+        self.envelope = Envelope()
+
+    def write(self, register: int, value: int):
+        if register == 0:
+            self.halt = bool(value & 0x20)
+            self.envelope.write(value)
+        elif register == 2:
+            self.short_mode = bool(value & 0x80)
+            self.timer_period = NOISE_PERIODS[value & 0x0F]
+        elif register == 3:
+            self.load_length(value >> 3)
+            self.envelope.start = True
+
+    def step_cycles(self) -> float:
+        return self.timer_period
+
+    def output_volume(self) -> int:
+        if self.length_counter == 0:
+            return 0
+
+        return self.envelope.output()
+
+    def clock_quarter(self):
+        self.envelope.clock()
+
+
+class DMC:
+    """
+    delta modulation channel, its output level only changes when a sample is playing
+    it's stepped one output bit at a time while there's something to play, skipped in one go otherwise
+    """
+
+    def __init__(self):
+        # set by the bus, sample bytes are read from CPU memory
+        self.read_memory = None
+
+        self.irq_enabled = False
+        self.loop = False
+        self.rate = DMC_RATES[0]
+        self.level = 0
+        self.sample_address = 0xC000
+        self.sample_length = 1
+
+        self.address = 0xC000
+        self.bytes_remaining = 0
+        self.buffer = None
+        self.shift = 0
+        self.bits_remaining = 8
+        self.silence = True
+        # CPU cycle of the next output clock
+        self.timer_cycle = 0
+        self.interrupt = False
+
+    def write(self, register: int, value: int) -> bool:
+        """
+        returns whether the output level was set
+        """
+        if register == 0:
+            self.irq_enabled = bool(value & 0x80)
+            if not self.irq_enabled:
+                self.interrupt = False
+            self.loop = bool(value & 0x40)
+            self.rate = DMC_RATES[value & 0x0F]
+        elif register == 1:
+            self.level = value & 0x7F
+            return True
+        elif register == 2:
+            self.sample_address = 0xC000 | (value << 6)
+        else:
+            self.sample_length = (value << 4) + 1
+
+        return False
+
+    def set_enabled(self, enabled: bool):
+        if not enabled:
+            self.bytes_remaining = 0
+        elif self.bytes_remaining == 0:
+            self.restart()
+            self.fetch()
+
+    def restart(self):
+        self.address = self.sample_address
+        self.bytes_remaining = self.sample_length
+
+    def fetch(self):
+        if self.buffer is not None or self.bytes_remaining == 0:
+            return
+
+        self.buffer = self.read_memory(self.address)
+        self.address = 0x8000 if self.address == 0xFFFF else self.address + 1
+        self.bytes_remaining -= 1
+
+        if self.bytes_remaining == 0:
+            if self.loop:
+                self.restart()
+            elif self.irq_enabled:
+                self.interrupt = True
+
+    def next_irq_cycle(self) -> float:
+        """
+        CPU cycle at which the last byte of the sample is read, raising the interrupt, infinite if it won't be
+        bytes are read when the output unit takes the buffer, every 8 output clocks
+        """
+        if not self.irq_enabled or self.loop or self.interrupt or self.bytes_remaining == 0 or self.buffer is None:
+            return math.inf
+
+        return self.timer_cycle + (self.bits_remaining - 1 + (self.bytes_remaining - 1) * 8) * self.rate
+
+    def run(self, cycle: int, levels: list):
+        """
+        clocks the output unit up to the cycle, every level change is added to levels as (cycle, level)
+        """
+        while self.timer_cycle <= cycle:
+            if self.silence and self.buffer is None and self.bytes_remaining == 0:
+                # nothing left to play, only the position in the output cycle has to be kept
+                clocks = (cycle - self.timer_cycle) // self.rate + 1
+                self.timer_cycle += clocks * self.rate
+                self.bits_remaining = (self.bits_remaining - 1 - clocks) % 8 + 1
+                return
+
+            if not self.silence:
+                if self.shift & 1:
+                    if self.level <= 125:
+                        self.level += 2
+                        levels.append((self.timer_cycle, self.level))
+                elif self.level >= 2:
+                    self.level -= 2
+                    levels.append((self.timer_cycle, self.level))
+                self.shift >>= 1
+
+            self.timer_cycle += self.rate
+            self.bits_remaining -= 1
+            if self.bits_remaining == 0:
+                self.bits_remaining = 8
+                if self.buffer is None:
+                    self.silence = True
+                else:
+                    self.silence = False
+                    self.shift = self.buffer
+                    self.buffer = None
+                    self.fetch()
+
+
+class APU:
+    """
+    audio processing unit, the registers at $4000-$4013, $4015 and $4017
+
+    registers, length counters, envelopes, sweeps and the frame counter are kept up to date as the CPU runs,
+    so $4015 reads are right, but no sample is made then: every change is logged with its CPU cycle
+    (see record) and the samples of the whole frame are made at once with numpy in end_frame
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.pulse1 = Pulse(ones_complement=True)
+        self.pulse2 = Pulse(ones_complement=False)
+        self.triangle = Triangle()
+        self.noise = Noise()
+        self.dmc = DMC()
+        self.channels: list[Channel] = [self.pulse1, self.pulse2, self.triangle, self.noise]
+
+        # CPU cycle the APU is synchronized to
+        self.cycle = 0
+        self.five_step = False
+        self.irq_inhibit = False
+        self.frame_interrupt = False
+        self.frame_sequence_start = 0
+        self.frame_step = 0
+
+        # samples are made when this is set and numpy is available, see end_frame
+        self.synthesize = numpy is not None
+        # everything that wants the samples of every frame, through write_samples
+        self.sinks = []
+        # CPU cycle of the next sample
+        self.sample_cycle = 0.0
+
+        # channel parameters since the start of the frame, one row per change, see record
+        self.segments: list[tuple] = []
+        # (cycle, level) of every change of the DMC output level since the start of the frame
+        self.dmc_levels: list[tuple] = []
+        self.start_frame(0)
+
+        if numpy is not None:
+            self.duty_table = numpy.array(DUTY_TABLE, dtype=numpy.int64)
+            self.triangle_sequence = numpy.array(TRIANGLE_SEQUENCE, dtype=numpy.int64)
+            self.noise_sequences = [numpy.frombuffer(sequence, dtype=numpy.uint8).astype(numpy.int64)
+                                    for sequence in NOISE_SEQUENCES]
+            self.pulse_table = numpy.array(PULSE_TABLE)
+            self.tnd_table = numpy.array(TND_TABLE)
+
+    def frame_sequence(self) -> list:
+        return FIVE_STEP_SEQUENCE if self.five_step else FOUR_STEP_SEQUENCE
+
+    def next_frame_step_cycle(self) -> int:
+        return self.frame_sequence_start + self.frame_sequence()[self.frame_step][0]
+
+    def catch_up(self, cycle: int):
+        """
+        runs the frame counter and the DMC up to the given CPU cycle
+        """
+        while self.next_frame_step_cycle() <= cycle:
+            self.run_frame_step()
+
+        self.dmc.run(cycle, self.dmc_levels)
+        self.cycle = cycle
+
+    def irq(self) -> bool:
+        return self.frame_interrupt or self.dmc.interrupt
+
+    def next_irq_cycle(self) -> float:
+        """
+        CPU cycle at which the frame counter or the DMC raises its next interrupt, infinite if none is coming
+        worked out from the current state, so the bus can schedule it without stepping the APU
+        """
+        cycle = math.inf
+        if not self.five_step and not self.irq_inhibit and not self.frame_interrupt:
+            cycle = self.frame_sequence_start + FOUR_STEP_SEQUENCE[-1][0]
+
+        return min(cycle, self.dmc.next_irq_cycle())
+
+    def run_frame_step(self):
+        step_cycle, flags = self.frame_sequence()[self.frame_step]
+        cycle = self.frame_sequence_start + step_cycle
+
+        self.advance(cycle)
+        if flags & FrameStep.QUARTER:
+            for channel in self.channels:
+                channel.clock_quarter()
+        if flags & FrameStep.HALF:
+            for channel in self.channels:
+                channel.clock_half()
+        if flags & FrameStep.IRQ and not self.irq_inhibit:
+            self.frame_interrupt = True
+        self.record(cycle)
+
+        self.frame_step += 1
+        if self.frame_step == len(self.frame_sequence()):
+            self.frame_step = 0
+            self.frame_sequence_start += FIVE_STEP_PERIOD if self.five_step else FOUR_STEP_PERIOD
+
+    def advance(self, cycle: int):
+        for channel in self.channels:
+            channel.advance(cycle)
+
+    def record(self, cycle: int):
+        """
+        logs the parameters every channel has from this cycle on
+        """
+        pulse1, pulse2, triangle, noise = self.channels
+        self.segments.append((
+            cycle,
+            pulse1.phase, pulse1.step_cycles(), pulse1.output_volume(), pulse1.duty,
+            pulse2.phase, pulse2.step_cycles(), pulse2.output_volume(), pulse2.duty,
+            triangle.phase, triangle.step_cycles(),
+            noise.phase, noise.step_cycles(), noise.output_volume(), int(noise.short_mode)
+        ))
+
+    def write(self, position: int, value: int):
+        self.advance(self.cycle)
+
+        if position <= 0x4003:
+            self.pulse1.write(position - 0x4000, value)
+        elif position <= 0x4007:
+            self.pulse2.write(position - 0x4004, value)
+        elif position <= 0x400B:
+            self.triangle.write(position - 0x4008, value)
+        elif position <= 0x400F:
+            self.noise.write(position - 0x400C, value)
+        elif position <= 0x4013:
+            if self.dmc.write(position - 0x4010, value):
+                self.dmc_levels.append((self.cycle, self.dmc.level))
+        elif position == 0x4015:
+            for i, channel in enumerate(self.channels):
+                channel.set_enabled(bool(value & (1 << i)))
+            self.dmc.interrupt = False
+            self.dmc.set_enabled(bool(value & 0x10))
+        elif position == 0x4017:
+            self.five_step = bool(value & 0x80)
+            self.irq_inhibit = bool(value & 0x40)
+            if self.irq_inhibit:
+                self.frame_interrupt = False
+            self.frame_sequence_start = self.cycle
+            self.frame_step = 0
+            if self.five_step:
+                for channel in self.channels:
+                    channel.clock_quarter()
+                    channel.clock_half()
+
+        self.record(self.cycle)
+
+    def read_status(self) -> int:
+        status = 0
+        for i, channel in enumerate(self.channels):
+            if channel.length_counter > 0:
+                status |= 1 << i
+        if self.dmc.bytes_remaining > 0:
+            status |= 0x10
+        if self.frame_interrupt:
+            status |= 0x40
+        if self.dmc.interrupt:
+            status |= 0x80
+
+        self.frame_interrupt = False
+        return status
+
+    def end_frame(self, cycle: int):
+        """
+        makes the samples from the start of the frame up to the cycle and hands them to the sinks
+        """
+        self.catch_up(cycle)
+
+        cycles_per_sample = CPU_FREQUENCY / self.sample_rate
+        count = max(0, math.ceil((cycle - self.sample_cycle) / cycles_per_sample))
+        # nothing is mixed without anybody to hand the samples to, like machines forked for searches
+        mix = self.synthesize and self.sinks
+        times = self.sample_cycle + numpy.arange(count) * cycles_per_sample if mix else None
+        self.sample_cycle += count * cycles_per_sample
+
+        if times is not None:
+            samples = self.mix(times)
+            for sink in self.sinks:
+                sink.write_samples(samples)
+
+        self.start_frame(cycle)
+
+    def start_frame(self, cycle: int):
+        self.advance(cycle)
+        for channel in self.channels:
+            channel.wrap_phase()
+
+        self.segments = []
+        self.record(cycle)
+        self.dmc_levels = [(cycle, self.dmc.level)]
+
+    def mix(self, times):
+        """
+        signed 16 bit samples at the given CPU cycles, made from the logged channel parameters
+        """
+        segments = numpy.array(self.segments)
+        rows = segments[numpy.searchsorted(segments[:, 0], times, side='right') - 1]
+        elapsed = times - rows[:, 0]
+
+        def steps(phase_column: int) -> numpy.ndarray:
+            return numpy.floor(rows[:, phase_column] + elapsed / rows[:, phase_column + 1]).astype(numpy.int64)
+
+        pulse1 = self.duty_table[rows[:, 4].astype(numpy.int64), steps(1) & 7] * rows[:, 3].astype(numpy.int64)
+        pulse2 = self.duty_table[rows[:, 8].astype(numpy.int64), steps(5) & 7] * rows[:, 7].astype(numpy.int64)
+        triangle = self.triangle_sequence[steps(9) & 31]
+
+        noise_steps = steps(11)
+        long_sequence, short_sequence = self.noise_sequences
+        noise = numpy.where(rows[:, 14] > 0,
+                            short_sequence[noise_steps % len(short_sequence)],
+                            long_sequence[noise_steps % len(long_sequence)]) * rows[:, 13].astype(numpy.int64)
+
+        levels = numpy.array(self.dmc_levels)
+        dmc = levels[numpy.searchsorted(levels[:, 0], times, side='right') - 1, 1].astype(numpy.int64)
+
+        output = self.pulse_table[pulse1 + pulse2] + self.tnd_table[3 * triangle + 2 * noise + dmc]
+        return (output * 32767).astype(numpy.int16)
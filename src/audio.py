@@ -0,0 +1,146 @@
+from time import sleep
+import numpy
+from apu import APU, SAMPLE_RATE
+
+
+class RingBuffer:
+    """
+    single producer, single consumer queue of samples over a preallocated array
+
+    the emulator only moves write_position and the audio callback only moves read_position,
+    both only ever grow, so the two sides never need a lock
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = numpy.zeros(capacity, dtype=numpy.int16)
+        self.write_position = 0
+        self.read_position = 0
+        self.last_sample = 0
+
+        # samples dropped because the buffer was full, and samples missing when the device wanted them
+        self.overflows = 0
+        self.underruns = 0
+
+    def fill(self) -> int:
+        return self.write_position - self.read_position
+
+    def write(self, samples):
+        count = min(len(samples), self.capacity - self.fill())
+        self.overflows += len(samples) - count
+
+        start = self.write_position % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start: start + first] = samples[:first]
+        self.data[:count - first] = samples[first: count]
+        self.write_position += count
+
+    def read_into(self, output):
+        """
+        fills output with the oldest samples, the last sample is repeated if there aren't enough
+        """
+        count = min(len(output), self.fill())
+
+        start = self.read_position % self.capacity
+        first = min(count, self.capacity - start)
+        output[:first] = self.data[start: start + first]
+        output[first: count] = self.data[:count - first]
+
+        if count > 0:
+            self.last_sample = output[count - 1]
+        if count < len(output):
+            output[count:] = self.last_sample
+            self.underruns += len(output) - count
+
+        self.read_position += count
+
+
+class AudioOutput:
+    """
+    plays the APU samples through the pygame mixer, its post mix callback pulls them from a ring buffer
+
+    it's an APU sink: every frame's samples are queued in write_samples, which also nudges the APU sample rate
+    so the buffer stays around target_fill (dynamic rate control), the emulator and the sound card
+    clocks never drift apart then
+    """
+
+    # largest change of the sample rate, a pitch change this small can't be heard
+    MAX_RATE_ADJUSTMENT = 0.005
+
+    def __init__(self, apu: APU, sample_rate: int = SAMPLE_RATE, latency: float = 0.05, chunk_size: int = 512):
+        import pygame
+        from pygame._sdl2.mixer import set_post_mix
+
+        self.apu = apu
+        self.sample_rate = sample_rate
+        self.target_fill = int(sample_rate * latency)
+        self.buffer = RingBuffer(self.target_fill * 4)
+        self.chunk = numpy.zeros(chunk_size, dtype=numpy.int16)
+
+        # signed 16 bit mono at exactly this rate, the samples are copied to the device as they are
+        pygame.mixer.init(frequency=sample_rate, size=-16, channels=1, buffer=chunk_size, allowedchanges=0)
+        set_post_mix(self.callback)
+
+        self.apu.sample_rate = sample_rate
+        self.apu.sinks.append(self)
+
+    def callback(self, postmix, stream):
+        count = len(stream) // 2
+        if len(self.chunk) < count:
+            self.chunk = numpy.zeros(count, dtype=numpy.int16)
+
+        chunk = self.chunk[:count]
+        self.buffer.read_into(chunk)
+        stream[:] = chunk.tobytes()
+
+    def write_samples(self, samples):
+        self.buffer.write(samples)
+
+        error = (self.target_fill - self.buffer.fill()) / self.target_fill
+        adjustment = max(-self.MAX_RATE_ADJUSTMENT, min(self.MAX_RATE_ADJUSTMENT, error * self.MAX_RATE_ADJUSTMENT))
+        self.apu.sample_rate = self.sample_rate * (1 + adjustment)
+
+    def close(self):
+        import pygame
+        from pygame._sdl2.mixer import set_post_mix
+
+        set_post_mix(None)
+        pygame.mixer.quit()
+
+
+class AudioPacer:
+    """
+    keeps emulation at the speed of the sound card instead of the wall clock, same interface as FramePacer
+
+    wait sleeps while more than target_fill samples are queued, for as long as the device takes to play
+    the excess, so nothing spins
+    should_render skips the rendering of frames while the buffer is under half its target, the host is behind then
+    """
+
+    def __init__(self, audio_output: AudioOutput, max_frame_skip: int = 4):
+        self.audio_output = audio_output
+        self.max_frame_skip = max_frame_skip
+
+        self.frame_count = 0
+        self.skipped_frames = 0
+        self.skipped_in_a_row = 0
+
+    def should_render(self) -> bool:
+        self.frame_count += 1
+
+        behind = self.audio_output.buffer.fill() < self.audio_output.target_fill // 2
+        if behind and self.skipped_in_a_row < self.max_frame_skip:
+            self.skipped_in_a_row += 1
+            self.skipped_frames += 1
+            return False
+
+        self.skipped_in_a_row = 0
+        return True
+
+    def reset(self):
+        self.skipped_in_a_row = 0
+
+    def wait(self):
+        excess = self.audio_output.buffer.fill() - self.audio_output.target_fill
+        if excess > 0:
+            sleep(excess / self.audio_output.sample_rate)
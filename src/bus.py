@@ -2,6 +2,7 @@ from io_registers import IO_Registers
 from memory_owner import MemoryOwner
 from ppu.ppu import PPU
 from ram import RAM
+from status import Status
 from rom import ROM
 
 
@@ -10,10 +11,20 @@ class Bus:
         self.ram = ram
         self.ppu = ppu
         self.io_regs = io_regs
+        self.apu = io_regs.apu
+        self.apu.dmc.read_memory = self.read_memory
         self.rom = rom
         self.update_ui_callback = None
         self.joystick_input_callback = None
 
+        # set by the CPU, its cycle counter is the clock every component is synchronized to
+        self.cpu = None
+        # CPU cycle at which the CPU has to call run_events
+        self.next_event_cycle = 0
+        # everything that can pull the IRQ line, with irq, next_irq_cycle and catch_up
+        # mappers with interrupts, like the MMC3 scanline counter, go here too
+        self.irq_sources = [self.apu]
+
         self.memory_owners: list[MemoryOwner] = [
             self.ram,
             self.ppu,
@@ -33,6 +44,12 @@ class Bus:
 
     def read_memory(self, position: int):
         mem_owner = self.get_memory_owner(position)
+
+        if mem_owner is self.ppu:
+            self.run_events()
+        elif mem_owner is self.io_regs:
+            self.apu.catch_up(self.cpu.cycle)
+
         return mem_owner.get(position)
 
     def read_memory_bytes(self, position: int, size: int = 1) -> bytes:
@@ -42,11 +59,24 @@ class Bus:
     def write_memory(self, position: int, value: int, num_bytes: int = 1):
         mem_owner = self.get_memory_owner(position)
 
-        if position == 0x4014:
+        if mem_owner is self.ppu:
+            self.run_events()
+        elif position == 0x4014:
+            self.run_events()
             self.write_to_oam_dma(value)
+        elif mem_owner is self.io_regs:
+            self.apu.catch_up(self.cpu.cycle)
 
         mem_owner.set(position, value, num_bytes)
 
+        if mem_owner is self.io_regs:
+            # APU writes can bring its interrupts forward
+            self.next_event_cycle = min(self.next_event_cycle, self.next_irq_cycle())
+
+        if self.ppu.nmi_interrupt:
+            # enabling NMI during vblank fires it right away
+            self.next_event_cycle = self.cpu.cycle
+
     def write_to_oam_dma(self, location: int):
         data_to_write = self.read_memory_bytes(location << 8, 256)
 
@@ -54,10 +84,53 @@ class Bus:
             value = data_to_write[i]
             self.ppu.write_oam_data(value)
 
-    def tick(self, cycles: int):
-        if self.ppu.tick(cycles * 3):
+    def reset_clock(self):
+        """
+        aligns the PPU clock with the CPU cycle counter and schedules the first event
+        """
+        self.ppu.clock = self.cpu.cycle * 3
+        self.schedule()
+
+    def run_events(self):
+        """
+        brings the PPU up to the current CPU cycle, running whatever happened since the last sync,
+        and schedules the next event
+        the PPU is only synchronized on access to its registers and when the scheduled event is due
+        the samples of the frame are made at vblank
+        """
+        if self.ppu.catch_up(self.cpu.cycle * 3):
+            self.apu.end_frame(self.cpu.cycle)
             self.joystick_input_callback()
             self.update_ui_callback()
 
+        for source in self.irq_sources:
+            if self.cpu.cycle >= source.next_irq_cycle():
+                source.catch_up(self.cpu.cycle)
+
+        self.schedule()
+
+    def schedule(self):
+        """
+        sets next_event_cycle to the next PPU event or interrupt, or to now when an interrupt is waiting to be taken
+        an IRQ masked by the CPU isn't waited for, check_interrupts is called when the mask may have been lifted
+        """
+        if self.ppu.nmi_interrupt or (self.irq_line() and not self.cpu.status_reg.bits[Status.StatusTypes.interrupt]):
+            self.next_event_cycle = self.cpu.cycle
+        else:
+            self.next_event_cycle = min(-(-self.ppu.next_event_clock() // 3), self.next_irq_cycle())
+
+    def check_interrupts(self):
+        """
+        called by the instructions that can clear the interrupt disable flag
+        """
+        if self.irq_line():
+            self.next_event_cycle = self.cpu.cycle
+
+    def irq_line(self) -> bool:
+        return any(source.irq() for source in self.irq_sources)
+
+    def next_irq_cycle(self) -> float:
+        return min(source.next_irq_cycle() for source in self.irq_sources)
+
     def get_nmi_status(self):
         return self.ppu.get_and_update_nmi()
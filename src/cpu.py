@@ -16,12 +16,14 @@ import instructions.unofficial_instructions as u_file
 
 
 class CPU:
-    def __init__(self, bus: Bus, debug: bool = False, nes_test: bool = False):
+    def __init__(self, bus: Bus, debug: bool = False, nes_test: bool = False, instructions: dict = None):
         self.rom = None
         self.bus = bus
+        self.bus.cpu = self
         self.debug = debug
         self.nes_test = nes_test
         self.cycle = 7  # debug variable to use nestest
+        self.instruction_count = 0
         self.reset_vector = 0xC000
         
         # status register: store a single byte
@@ -38,13 +40,21 @@ class CPU:
 
         self.running = True
 
-        # create the instructions that the cpu can interpret
+        # the instructions are stateless, CPUs forked from this one share the dict
+        self.instructions: dict[bytes, Instruction] = instructions or self.create_instructions()
+
+    def create_instructions(self) -> dict[bytes, Instruction]:
+        """
+        create the instructions that the cpu can interpret
+        """
         instructions_list = self.find_instructions(Instruction)
-        self.instructions: dict[bytes, Instruction] = {}
+        instructions = {}
         for instruction in instructions_list:
-            if instruction.identifier_byte in self.instructions.keys():
+            if instruction.identifier_byte in instructions.keys():
                 raise Exception('Duplicate instruction identifier bytes ' + instruction.identifier_byte.hex())
-            self.instructions[instruction.identifier_byte] = instruction
+            instructions[instruction.identifier_byte] = instruction
+
+        return instructions
 
     def start_up(self, update_ui_callback, handle_input_callback):
         """
@@ -68,6 +78,22 @@ class CPU:
         self.y_reg = 0
         self.a_reg = 0
 
+    def interrupt(self, vector: int):
+        """
+        pushes the program counter and the status, with the break flag clear, and jumps to the handler
+        """
+        self.push_to_stack(self.pc_reg, 2)
+
+        status_reg_copy = self.status_reg.copy()
+        status_reg_copy.bits[Status.StatusTypes.break1] = 0
+        status_reg_copy.bits[Status.StatusTypes.break2] = 1
+
+        self.push_to_stack(status_reg_copy.to_int(), 1)
+
+        self.status_reg.bits[Status.StatusTypes.interrupt] = 1
+
+        self.pc_reg = int.from_bytes(self.bus.read_memory_bytes(vector, 2), byteorder='little')
+
     def push_to_stack(self, value, size):
         for i in range(size):
             self.bus.write_memory(0x0100 + self.sp_reg, (value >> (8 * (size - i - 1))) & 255, num_bytes=1)
@@ -96,22 +122,27 @@ class CPU:
 
         # run program
         self.running = True
-        last_time = time_ns()
-        
-        while self.running:
-            if self.bus.get_nmi_status():
-                self.push_to_stack(self.pc_reg, 2)
-
-                status_reg_copy = self.status_reg.copy()
-                status_reg_copy.bits[Status.StatusTypes.break1] = 0
-                status_reg_copy.bits[Status.StatusTypes.break2] = 1
-
-                self.push_to_stack(status_reg_copy.to_int(), 1)
+        self.bus.reset_clock()
+        self.run()
 
-                self.status_reg.bits[Status.StatusTypes.interrupt] = 1
+    def run(self):
+        """
+        runs instructions until running is cleared, from wherever the last run stopped
+        """
+        last_time = time_ns()
 
-                self.bus.tick(2)
-                self.pc_reg = int.from_bytes(self.bus.read_memory_bytes(0xFFFA, 2), byteorder='little')
+        while self.running:
+            # the PPU is left alone until something is scheduled for it, see Bus.run_events
+            if self.cycle >= self.bus.next_event_cycle:
+                self.bus.run_events()
+
+                # run_events only leaves an event due now when an interrupt is waiting, see Bus.schedule
+                if self.bus.get_nmi_status():
+                    self.interrupt(0xFFFA)
+                    self.cycle += 2
+                elif self.bus.irq_line() and not self.status_reg.bits[Status.StatusTypes.interrupt]:
+                    self.interrupt(0xFFFE)
+                    self.cycle += 7
 
             # get the current byte at pc
             identifier_byte = self.bus.read_memory_bytes(self.pc_reg)
@@ -132,11 +163,10 @@ class CPU:
             instr_cycles = instruction.get_cycles()
 
             self.cycle += instr_cycles
+            self.instruction_count += 1
 
             self.status_reg.update(instruction, value)
 
-            self.bus.tick(instr_cycles)
-
             cur_time = time_ns()
 
             # print('time spent this cpu instruction: {} - {}'.format((cur_time - last_time) / 10**9, instruction))
@@ -1,14 +1,55 @@
+from image import encode_png, encode_ppm
+
+
 class Frame:
     WIDTH = 256
     HEIGHT = 240
 
-    def __init__(self) -> None:
-        self.data = [(0, 0, 0)] * Frame.WIDTH * Frame.HEIGHT
-        self.pixels_to_update = []
+    def __init__(self, data=None) -> None:
+        # one system palette index per pixel, row by row
+        # frontends turn it into colors with a palette instead of converting it pixel by pixel
+        # data can be any writable buffer of that size, e.g. shared memory
+        self.data = data if data is not None else bytearray(Frame.WIDTH * Frame.HEIGHT)
 
-    def set_pixel(self, x: int, y: int, rgb: tuple[int, int, int]):
+    def set_pixel(self, x: int, y: int, color: int):
         position = y * Frame.WIDTH + x
         if position < 256 * 240:
-            if self.data[position] != rgb:
-                self.data[position] = rgb
-                self.pixels_to_update.append([x, y, rgb])
+            self.data[position] = color
+
+    def fill(self, color: int):
+        self.data[:] = bytes((color,)) * (Frame.WIDTH * Frame.HEIGHT)
+
+    @staticmethod
+    def palette() -> list[tuple[int, int, int]]:
+        # imported here, the PPU module imports Frame
+        from ppu.ppu import PPU
+
+        # palette values above $3F repeat the system palette
+        return PPU.SYSTEM_PALLETE * 4
+
+    def to_png(self, compression: int = 6) -> bytes:
+        return encode_png(bytes(self.data), Frame.WIDTH, Frame.HEIGHT, Frame.palette(), compression)
+
+    def to_ppm(self) -> bytes:
+        return encode_ppm(self.data, Frame.WIDTH, Frame.HEIGHT, Frame.palette())
+
+    def save_png(self, path: str, compression: int = 6):
+        with open(path, 'wb') as file:
+            file.write(self.to_png(compression))
+
+    def save_ppm(self, path: str):
+        with open(path, 'wb') as file:
+            file.write(self.to_ppm())
+
+    def to_numpy(self, rgb: bool = True):
+        """
+        returns a copy of the frame as a numpy array, (240, 256, 3) colors or (240, 256) palette indexes
+        numpy is only needed by this method
+        """
+        import numpy
+
+        indexes = numpy.frombuffer(self.data, dtype=numpy.uint8).reshape(Frame.HEIGHT, Frame.WIDTH).copy()
+        if not rgb:
+            return indexes
+
+        return numpy.array(Frame.palette(), dtype=numpy.uint8)[indexes]
@@ -0,0 +1,80 @@
+from cpu import CPU
+from frame import Frame
+from io_registers import IO_Registers
+from metrics import Metrics
+from pacing import FramePacer, FastForward
+from render_worker import RenderWorker
+from run_ahead import RunAhead
+from ppu.ppu import PPU
+
+
+class Frontend:
+    """
+    what every frontend does at vblank: pacing and fast forward, rendering (run ahead included),
+    recorders and metrics
+    frontends only differ in present, which gets every rendered frame
+    """
+
+    def __init__(self, ppu: PPU, io_regs: IO_Registers, cpu: CPU, pacer: FramePacer = None,
+                 render_worker: RenderWorker = None, metrics: Metrics = None, recorders: list = None,
+                 fast_forward: FastForward = None, run_ahead: RunAhead = None):
+        self.io_regs = io_regs
+        self.ppu = ppu
+        self.cpu = cpu
+        self.pacer = pacer
+        self.fast_forward = fast_forward or FastForward(io_regs.apu, pacer)
+        self.render_worker = render_worker
+        self.run_ahead = run_ahead
+        self.metrics = metrics
+        # everything that wants every shown frame: video recorders, movie hashes
+        self.recorders = recorders or []
+        self.frame = Frame()
+        # the last frame presented, frames of the render worker are only valid until the next one
+        self.last_frame = None
+        self.update_ui_callback = self.update_ui
+
+    def update_ui(self):
+        if self.metrics is not None:
+            self.metrics.start_frame(self.cpu.instruction_count)
+
+        pacer = self.fast_forward if self.fast_forward.active else self.pacer
+        if pacer is not None and not pacer.should_render():
+            if self.metrics is not None:
+                self.metrics.end_frame(skipped=True)
+            return
+
+        frame = self.render() if self.run_ahead is None else self.run_ahead.run(self.render)
+
+        if self.metrics is not None:
+            self.metrics.end_render()
+
+        if frame is not None:
+            self.last_frame = frame
+            for recorder in self.recorders:
+                recorder.write_frame(frame)
+
+            self.present(frame)
+
+        if self.metrics is not None:
+            self.metrics.end_present()
+
+        if pacer is not None:
+            pacer.wait()
+
+        if self.metrics is not None:
+            self.metrics.end_frame()
+
+    def render(self):
+        """
+        returns the frame to present, None when the render worker has nothing new yet
+        frames coming from the render worker are only valid until the next call
+        """
+        if self.render_worker is None:
+            self.ppu.render(self.frame)
+            return self.frame
+
+        self.render_worker.submit(self.ppu)
+        return self.render_worker.latest_frame()
+
+    def present(self, frame: Frame):
+        pass
@@ -0,0 +1,66 @@
+from queue import Queue, Empty, Full
+from cpu import CPU
+from frame import Frame
+from frontend import Frontend
+from io_registers import IO_Registers
+from metrics import Metrics
+from pacing import FramePacer, FastForward
+from render_worker import RenderWorker
+from run_ahead import RunAhead
+from ppu.ppu import PPU
+
+
+class HeadlessUI(Frontend):
+    """
+    frontend for running without a display, it never imports pygame
+
+    every rendered frame goes to frame_callback, or to the frames queue as bytes when there's no callback
+    (the oldest frame is dropped when nobody is consuming the queue)
+    input is given programmatically with set_buttons and reaches the joypads at the next frame
+    fast_forward.start(frames) runs the next frames unpaced, handing out only every render_interval-th one
+    """
+
+    def __init__(self, ppu: PPU, io_regs: IO_Registers, cpu: CPU, frame_callback=None, max_frames: int = 0,
+                 queue_size: int = 2, pacer: FramePacer = None, render_worker: RenderWorker = None,
+                 metrics: Metrics = None, recorders: list = None,
+                 fast_forward: FastForward = None, run_ahead: RunAhead = None):
+        super().__init__(ppu, io_regs, cpu, pacer=pacer, render_worker=render_worker, metrics=metrics,
+                         recorders=recorders, fast_forward=fast_forward, run_ahead=run_ahead)
+        self.frame_callback = frame_callback
+        self.frames: Queue = Queue(maxsize=queue_size)
+        self.max_frames = max_frames
+        self.frame_count = 0
+
+        # button status of joypad 1 and 2, see Joypad.JoypadButton
+        self.buttons = [0, 0]
+
+    def update_ui(self):
+        self.frame_count += 1
+        super().update_ui()
+
+        if self.max_frames and self.frame_count >= self.max_frames:
+            self.cpu.running = False
+
+    def present(self, frame: Frame):
+        if self.frame_callback is not None:
+            self.frame_callback(frame)
+        else:
+            self.push_frame(bytes(frame.data))
+
+    def push_frame(self, data: bytes):
+        while True:
+            try:
+                self.frames.put_nowait(data)
+                return
+            except Full:
+                try:
+                    self.frames.get_nowait()
+                except Empty:
+                    pass
+
+    def set_buttons(self, button_status: int, joypad: int = 1):
+        self.buttons[joypad - 1] = button_status & 0xFF
+
+    def handle_joystick_input(self):
+        self.io_regs.joypad1.button_status = self.buttons[0]
+        self.io_regs.joypad2.button_status = self.buttons[1]
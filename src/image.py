@@ -0,0 +1,39 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def encode_png(indexes: bytes, width: int, height: int, palette: list[tuple[int, int, int]],
+               compression: int = 6) -> bytes:
+    """
+    encodes palette indexes as an 8 bit indexed PNG, the pixels are stored as they are
+    so nothing is converted pixel by pixel
+    """
+    # every row starts with its filter type, 0 is none
+    rows = b''.join(b'\x00' + indexes[y * width: (y + 1) * width] for y in range(height))
+
+    return b''.join([
+        PNG_SIGNATURE,
+        png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        png_chunk(b'PLTE', b''.join(bytes(rgb) for rgb in palette)),
+        png_chunk(b'IDAT', zlib.compress(rows, compression)),
+        png_chunk(b'IEND', b'')
+    ])
+
+
+def encode_ppm(indexes: bytes, width: int, height: int, palette: list[tuple[int, int, int]]) -> bytes:
+    """
+    encodes palette indexes as a binary RGB PPM, every channel is looked up for all pixels at once
+    """
+    pixels = bytes(indexes)
+    rgb = bytearray(width * height * 3)
+    for channel in range(3):
+        table = bytes(palette[i % len(palette)][channel] for i in range(256))
+        rgb[channel::3] = pixels.translate(table)
+
+    return b'P6\n%d %d\n255\n' % (width, height) + bytes(rgb)
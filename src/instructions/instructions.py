@@ -40,6 +40,11 @@ class Cli(ClearBit):
     identifier_byte = bytes([0x58])
     bit = Status.StatusTypes.interrupt
 
+    @classmethod
+    def apply_side_effects(cls, cpu, memory_address, value):
+        super().apply_side_effects(cpu, memory_address, value)
+        cpu.bus.check_interrupts()
+
 
 class Bit(Instruction):
     @classmethod
@@ -59,6 +59,7 @@ class Rti(ImplicitAddressing, Instruction):
         cpu.status_reg.bits[Status.StatusTypes.break2] = bit5
 
         cpu.pc_reg = cpu.pull_from_stack(2)
+        cpu.bus.check_interrupts()
 
 
 # branch sets
@@ -154,6 +154,7 @@ class Plp(ImplicitAddressing, PullFromStack):
         bits_4_5 = current_value & ((1 << 5) | (1 << 4))
         remove_bits_4_5 = (~((1 << 5) | (1 << 4))) & 255
         cpu.status_reg.from_int((value & remove_bits_4_5) | bits_4_5)
+        cpu.bus.check_interrupts()
 
     @classmethod
     def get_cycles(cls):
@@ -1,3 +1,4 @@
+from apu import APU
 from joypad import Joypad
 from memory_owner import MemoryOwner
 
@@ -7,12 +8,15 @@ class IO_Registers(MemoryOwner):
         super().__init__(0x4000, 0x401F)
         self.joypad1 = Joypad()
         self.joypad2 = Joypad()
+        self.apu = APU()
 
     def get(self, position: int):
         if position == 0x4016:
             return self.joypad1.read()
         elif position == 0x4017:
             return self.joypad2.read()
+        elif position == 0x4015:
+            return self.apu.read_status()
 
         return super().get(position)
 
@@ -21,5 +25,8 @@ class IO_Registers(MemoryOwner):
             self.joypad1.write(value)
             self.joypad2.write(value)
             return
+        elif position <= 0x4013 or position == 0x4015 or position == 0x4017:
+            self.apu.write(position, value)
+            return
 
         super().set(position, value)
@@ -0,0 +1,143 @@
+import json
+import pygame
+from joypad import Joypad
+
+# names are pygame key names, the ones pygame.key.name gives
+DEFAULT_CONFIG = {
+    'joypad1': {
+        'keys': {
+            'up': 'UP',
+            'left': 'LEFT',
+            'down': 'DOWN',
+            'right': 'RIGHT',
+            'z': 'BUTTON_A',
+            'x': 'BUTTON_B',
+            'a': 'START',
+            's': 'SELECT'
+        },
+        'joystick': 0,
+        'joystick_buttons': {'0': 'BUTTON_A', '1': 'BUTTON_B', '6': 'SELECT', '7': 'START'}
+    },
+    'joypad2': {
+        'keys': {
+            'i': 'UP',
+            'j': 'LEFT',
+            'k': 'DOWN',
+            'l': 'RIGHT',
+            'n': 'BUTTON_A',
+            'm': 'BUTTON_B',
+            'o': 'START',
+            'u': 'SELECT'
+        },
+        'joystick': 1,
+        'joystick_buttons': {'0': 'BUTTON_A', '1': 'BUTTON_B', '6': 'SELECT', '7': 'START'}
+    }
+}
+
+JOYPADS = ('joypad1', 'joypad2')
+AXIS_DEAD_ZONE = 0.5
+
+
+def button_mask(name: str) -> int:
+    mask = getattr(Joypad.JoypadButton, name.upper(), None)
+    if not isinstance(mask, int):
+        raise ValueError('unknown joypad button: {}'.format(name))
+
+    return mask
+
+
+class Keymap:
+    """
+    key and gamepad bindings of both joypads
+
+    bindings map a key code, or a (joystick, button) pair, to (joypad index, JoypadButton mask)
+    sample reads the whole keyboard and the bound joysticks once, giving the status byte of each joypad
+    the d-pad of a joystick comes from its first hat and its first two axes
+    """
+
+    def __init__(self, config: dict = None):
+        config = DEFAULT_CONFIG if config is None else config
+        # key names are resolved through the display's keyboard, it has to be up first
+        pygame.display.init()
+
+        self.key_bindings: dict[int, tuple] = {}
+        self.joystick_bindings: dict[tuple, tuple] = {}
+        # joystick device index -> joypad index
+        self.joystick_pads: dict[int, int] = {}
+        self.joysticks: dict[int, pygame.joystick.JoystickType] = {}
+
+        for pad, name in enumerate(JOYPADS):
+            pad_config = config.get(name, {})
+
+            for key_name, button in pad_config.get('keys', {}).items():
+                self.key_bindings[pygame.key.key_code(key_name)] = (pad, button_mask(button))
+
+            device = pad_config.get('joystick')
+            if device is None:
+                continue
+
+            self.joystick_pads[device] = pad
+            for joystick_button, button in pad_config.get('joystick_buttons', {}).items():
+                self.joystick_bindings[(device, int(joystick_button))] = (pad, button_mask(button))
+
+    @staticmethod
+    def load(path: str) -> 'Keymap':
+        with open(path) as file:
+            return Keymap(json.load(file))
+
+    def open_joysticks(self):
+        """
+        opens the bound joysticks that are plugged in, the others are ignored
+        """
+        pygame.joystick.init()
+        for device in self.joystick_pads:
+            if device < pygame.joystick.get_count():
+                self.joysticks[device] = pygame.joystick.Joystick(device)
+
+    def sample(self) -> list:
+        """
+        returns the button status of both joypads, the event queue has to be pumped first
+        """
+        status = [0, 0]
+
+        pressed = pygame.key.get_pressed()
+        for key, (pad, mask) in self.key_bindings.items():
+            if pressed[key]:
+                status[pad] |= mask
+
+        for (device, joystick_button), (pad, mask) in self.joystick_bindings.items():
+            joystick = self.joysticks.get(device)
+            if joystick is not None and joystick_button < joystick.get_numbuttons() \
+                    and joystick.get_button(joystick_button):
+                status[pad] |= mask
+
+        for device, joystick in self.joysticks.items():
+            status[self.joystick_pads[device]] |= self.sample_directions(joystick)
+
+        return status
+
+    @staticmethod
+    def sample_directions(joystick) -> int:
+        x = y = 0
+        if joystick.get_numhats() > 0:
+            x, y = joystick.get_hat(0)
+            y = -y  # hats point up with positive y, axes with negative
+
+        if joystick.get_numaxes() >= 2:
+            if abs(joystick.get_axis(0)) > AXIS_DEAD_ZONE:
+                x = 1 if joystick.get_axis(0) > 0 else -1
+            if abs(joystick.get_axis(1)) > AXIS_DEAD_ZONE:
+                y = 1 if joystick.get_axis(1) > 0 else -1
+
+        status = 0
+        if x < 0:
+            status |= Joypad.JoypadButton.LEFT
+        elif x > 0:
+            status |= Joypad.JoypadButton.RIGHT
+
+        if y < 0:
+            status |= Joypad.JoypadButton.UP
+        elif y > 0:
+            status |= Joypad.JoypadButton.DOWN
+
+        return status
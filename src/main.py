@@ -1,11 +1,18 @@
 import argparse
+import sys
 from bus import Bus
 from cpu import CPU
 from io_registers import IO_Registers
+from metrics import Metrics
+from movie import MoviePlayer, MovieRecorder
+from pacing import FramePacer, FastForward
+from render_worker import RenderWorker
+from rewind import RewindBuffer
+from run_ahead import RunAhead
 from ram import RAM
+from recorder import create_audio_recorder, create_recorder
 from ppu.ppu import PPU
 from rom import ROM
-from ui import UI
 
 
 def main():
@@ -20,8 +27,62 @@ def main():
 
     parser.add_argument('--debug', dest='debug', const=True, default=False, help='logs the running program', nargs='?')
     parser.add_argument('--nestest', dest='nestest', const=True, default=False, help='runs nestest rom', nargs='?')
+    parser.add_argument('--headless', dest='headless', const=True, default=False,
+                        help='runs without opening a window, pygame is not needed', nargs='?')
+    parser.add_argument('--frames', dest='frames', type=int, default=0,
+                        help='stops after this many frames when running headless')
+    parser.add_argument('--pace', dest='pace', const=True, default=False,
+                        help='runs at NES speed (60.0988 fps), skipping the rendering of frames when behind', nargs='?')
+    parser.add_argument('--max-frame-skip', dest='max_frame_skip', type=int, default=4,
+                        help='most frames skipped in a row when pacing')
+    parser.add_argument('--render-process', dest='render_process', const=True, default=False,
+                        help='renders frames in a separate process, overlapping with emulation', nargs='?')
+    parser.add_argument('--metrics', dest='metrics', type=str, default='',
+                        help='writes per frame timings to this file at exit, as csv or json depending on the extension')
+    parser.add_argument('--overlay', dest='overlay', const=True, default=False,
+                        help='draws fps and timings on screen', nargs='?')
+    parser.add_argument('--record', dest='record', type=str, default='',
+                        help='records every frame to a .y4m video, or to a sequence of images for a .png path')
+    parser.add_argument('--record-movie', dest='record_movie', type=str, default='',
+                        help='records the input of every frame, with frame hashes, to this file')
+    parser.add_argument('--play-movie', dest='play_movie', type=str, default='',
+                        help='replays the input of a recorded movie, checking the frame hashes, and stops at its end')
+    parser.add_argument('--screenshot', dest='screenshot', type=str, default='',
+                        help='writes the last frame to this .png or .ppm file at exit')
+    parser.add_argument('--dump-audio', dest='dump_audio', type=str, default='',
+                        help='writes the sound to a .wav file, or to raw 16 bit PCM for other extensions, needs numpy')
+    parser.add_argument('--audio', dest='audio', const=True, default=False,
+                        help='plays sound and paces emulation off the audio buffer, needs numpy', nargs='?')
+    parser.add_argument('--rewind', dest='rewind', type=float, default=0,
+                        help='megabytes kept for rewinding, played back while backspace is held')
+    parser.add_argument('--fast-forward', dest='fast_forward', type=int, default=0,
+                        help='runs this many frames at the start as fast as possible, tab toggles it in the window')
+    parser.add_argument('--fast-forward-interval', dest='fast_forward_interval', type=int, default=8,
+                        help='renders one frame in this many while fast forwarding')
+    parser.add_argument('--run-ahead', dest='run_ahead', type=int, default=0,
+                        help='shows the frame this many frames ahead, hiding as many frames of input lag')
+    parser.add_argument('--keymap', dest='keymap', type=str, default='',
+                        help='json file with the key and joystick bindings of both joypads')
     args = parser.parse_args()
 
+    if args.render_process and (args.record_movie or args.play_movie):
+        parser.error('movies hash every frame in order, they can\'t be used with --render-process')
+
+    if args.render_process and args.record:
+        parser.error('the render process drops frames when it falls behind, --record can\'t be used with it')
+
+    if args.fast_forward and (args.record_movie or args.play_movie):
+        parser.error('movies hash every frame in order, they can\'t be used with --fast-forward')
+
+    if args.run_ahead and (args.record_movie or args.play_movie):
+        parser.error('movies hash the frames the game is at, they can\'t be used with --run-ahead')
+
+    if args.rewind and (args.record_movie or args.play_movie):
+        parser.error('movies need every frame in order, they can\'t be used with --rewind')
+
+    if args.audio and args.headless:
+        parser.error('sound is played through pygame, it can\'t be used with --headless')
+
     if args.nestest:
         args.debug = True
         with open('nestest.nes', 'rb') as file:
@@ -45,10 +106,109 @@ def main():
     # create cpu
     cpu = CPU(bus, args.debug, args.nestest)
     
-    ui = UI(ppu, io_regs, cpu)
+    recorders = []
+    if args.record:
+        recorders.append(create_recorder(args.record))
+
+    audio_recorder = None
+    if args.dump_audio:
+        if not io_regs.apu.synthesize:
+            parser.error('--dump-audio needs numpy to make the samples')
+        audio_recorder = create_audio_recorder(args.dump_audio)
+        io_regs.apu.sinks.append(audio_recorder)
+
+    movie_recorder = MovieRecorder(args.record_movie) if args.record_movie else None
+    if movie_recorder is not None:
+        recorders.append(movie_recorder)
+
+    movie_player = MoviePlayer(args.play_movie) if args.play_movie else None
+    if movie_player is not None:
+        recorders.append(movie_player)
+
+    # recordings need every frame, pacing can only sleep then
+    max_frame_skip = 0 if recorders else args.max_frame_skip
+    audio_output = None
+    if args.audio:
+        if not io_regs.apu.synthesize:
+            parser.error('--audio needs numpy to make the samples')
+        # numpy is only needed for sound
+        from audio import AudioOutput, AudioPacer
+        audio_output = AudioOutput(io_regs.apu)
+        pacer = AudioPacer(audio_output, max_frame_skip=max_frame_skip)
+    else:
+        pacer = FramePacer(max_frame_skip=max_frame_skip) if args.pace else None
+    render_worker = RenderWorker(rom.chr_rom, rom.screen_mirroring) if args.render_process else None
+    metrics = Metrics() if args.metrics or args.overlay else None
+    fast_forward = FastForward(io_regs.apu, pacer, render_interval=args.fast_forward_interval)
+    if args.fast_forward:
+        fast_forward.start(args.fast_forward)
+    run_ahead = RunAhead(cpu, args.run_ahead) if args.run_ahead else None
+
+    if args.headless:
+        from headless import HeadlessUI
+        ui = HeadlessUI(ppu, io_regs, cpu, max_frames=args.frames, pacer=pacer, render_worker=render_worker,
+                        metrics=metrics, recorders=recorders, fast_forward=fast_forward, run_ahead=run_ahead)
+    else:
+        # pygame is only imported when there's a window to show
+        from keymap import Keymap
+        from ui import UI
+        keymap = Keymap.load(args.keymap) if args.keymap else Keymap()
+        rewind = RewindBuffer(budget_mb=args.rewind) if args.rewind else None
+        ui = UI(ppu, io_regs, cpu, pacer=pacer, render_worker=render_worker, metrics=metrics,
+                overlay=args.overlay, recorders=recorders, keymap=keymap, rewind=rewind, fast_forward=fast_forward,
+                run_ahead=run_ahead)
 
-    cpu.start_up(ui.update_ui_callback, ui.handle_joystick_input)
-    cpu.run_rom(rom)
+    def handle_input():
+        if movie_player is None:
+            ui.handle_joystick_input()
+        elif movie_player.finished():
+            cpu.running = False
+        else:
+            movie_player.apply_input(io_regs)
+
+        if movie_recorder is not None:
+            movie_recorder.record_input(io_regs)
+
+    cpu.start_up(ui.update_ui_callback, handle_input)
+    try:
+        cpu.run_rom(rom)
+
+        if args.screenshot and ui.last_frame is not None:
+            save_screenshot(ui.last_frame, args.screenshot)
+    finally:
+        if render_worker is not None:
+            # frames of the render worker live in its shared memory, which goes away with it
+            ui.last_frame = None
+            render_worker.close()
+
+        for recorder in recorders:
+            recorder.close()
+
+        if audio_output is not None:
+            audio_output.close()
+
+        if audio_recorder is not None:
+            audio_recorder.close()
+
+        if metrics is not None and args.metrics:
+            metrics.dump(args.metrics)
+
+    if pacer is not None:
+        print("Skipped frames: {} of {}".format(pacer.skipped_frames, pacer.frame_count))
+
+    if movie_player is not None:
+        if movie_player.first_mismatch is None:
+            print("Movie replayed: {} frames, all frames match".format(movie_player.checked_frames))
+        else:
+            print("Movie replayed: frame {} differs from the recording".format(movie_player.first_mismatch))
+            sys.exit(1)
+
+
+def save_screenshot(frame, path: str):
+    if path.endswith('.ppm'):
+        frame.save_ppm(path)
+    else:
+        frame.save_png(path)
 
 
 if __name__ == '__main__':
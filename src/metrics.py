@@ -0,0 +1,116 @@
+import csv
+import json
+from collections import deque
+from time import time_ns
+
+
+class Metrics:
+    """
+    per frame timings of the emulator, kept in memory instead of printed
+
+    a frontend calls, at every vblank:
+    start_frame -> end_render -> end_present -> end_frame
+    skipped frames only call start_frame and end_frame(skipped=True)
+    the time between the end of a frame and the start of the next one is spent emulating the CPU
+    """
+
+    CSV_COLUMNS = ['frame', 'cpu_ms', 'render_ms', 'present_ms', 'idle_ms', 'instructions', 'fps', 'skipped']
+    FPS_BUCKET_SIZE = 5
+
+    def __init__(self, window: int = 120):
+        self.rows = []
+        self.window = deque(maxlen=window)
+        self.fps_histogram: dict[int, int] = {}
+
+        self.frame_count = 0
+        self.skipped_frames = 0
+        self.last_instruction_count = 0
+        self.last_start_time = None
+        self.last_end_time = None
+        self.frame_times = [0, 0, 0]  # start, render end, present end
+        self.instructions = 0
+        self.fps = 0.0
+
+    def start_frame(self, instruction_count: int):
+        now = time_ns()
+        self.frame_times = [now, now, now]
+        self.instructions = instruction_count - self.last_instruction_count
+        self.last_instruction_count = instruction_count
+
+        self.fps = 0.0
+        if self.last_start_time is not None:
+            self.fps = 10**9 / max(now - self.last_start_time, 1)
+        self.last_start_time = now
+
+    def end_render(self):
+        now = time_ns()
+        self.frame_times[1] = now
+        self.frame_times[2] = now
+
+    def end_present(self):
+        self.frame_times[2] = time_ns()
+
+    def end_frame(self, skipped: bool = False):
+        now = time_ns()
+        start, render_end, present_end = self.frame_times
+
+        cpu_time = start - self.last_end_time if self.last_end_time is not None else 0
+        self.last_end_time = now
+
+        row = (
+            self.frame_count,
+            cpu_time / 10**6,
+            (render_end - start) / 10**6,
+            (present_end - render_end) / 10**6,
+            (now - present_end) / 10**6,
+            self.instructions,
+            self.fps,
+            skipped
+        )
+        self.rows.append(row)
+        self.window.append(row)
+
+        self.frame_count += 1
+        if skipped:
+            self.skipped_frames += 1
+
+        if self.fps:
+            bucket = int(self.fps // Metrics.FPS_BUCKET_SIZE) * Metrics.FPS_BUCKET_SIZE
+            self.fps_histogram[bucket] = self.fps_histogram.get(bucket, 0) + 1
+
+    def summary(self) -> dict:
+        """
+        averages over the last frames of the window, counters over the whole run
+        """
+        count = max(len(self.window), 1)
+
+        def average(column):
+            return sum(row[column] for row in self.window) / count
+
+        return {
+            'frames': self.frame_count,
+            'skipped_frames': self.skipped_frames,
+            'fps': average(6),
+            'cpu_ms': average(1),
+            'render_ms': average(2),
+            'present_ms': average(3),
+            'idle_ms': average(4),
+            'instructions_per_frame': average(5),
+            'fps_histogram': dict(sorted(self.fps_histogram.items())),
+        }
+
+    def dump(self, path: str):
+        """
+        writes every frame as csv, or the summary plus every frame as json, depending on the extension
+        """
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(Metrics.CSV_COLUMNS)
+                writer.writerows(self.rows)
+        else:
+            with open(path, 'w') as file:
+                json.dump({
+                    'summary': self.summary(),
+                    'frames': [dict(zip(Metrics.CSV_COLUMNS, row)) for row in self.rows]
+                }, file)
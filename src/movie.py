@@ -0,0 +1,100 @@
+import struct
+from hashlib import blake2b
+from frame import Frame
+from io_registers import IO_Registers
+
+MOVIE_MAGIC = b'PNMV'
+MOVIE_VERSION = 1
+HAS_FRAME_HASHES = 0b1
+
+# magic, version, flags, frame count
+HEADER = struct.Struct('<4sBBI')
+HASH_SIZE = 8
+
+
+def hash_frame(frame: Frame) -> bytes:
+    return blake2b(frame.data, digest_size=HASH_SIZE).digest()
+
+
+class MovieRecorder:
+    """
+    records the joypads once per frame, 1 byte per joypad, plus a hash of every rendered frame
+
+    layout: header, then the input of every frame (joypad 1, joypad 2), then the frame hashes
+    """
+
+    def __init__(self, path: str, frame_hashes: bool = True):
+        self.path = path
+        self.frame_hashes = frame_hashes
+        self.inputs = bytearray()
+        self.hashes = []
+
+    def record_input(self, io_regs: IO_Registers):
+        self.inputs.append(io_regs.joypad1.button_status)
+        self.inputs.append(io_regs.joypad2.button_status)
+
+    def write_frame(self, frame: Frame):
+        if self.frame_hashes:
+            self.hashes.append(hash_frame(frame))
+
+    def close(self):
+        frame_count = len(self.inputs) // 2
+        flags = HAS_FRAME_HASHES if self.frame_hashes else 0
+
+        with open(self.path, 'wb') as file:
+            file.write(HEADER.pack(MOVIE_MAGIC, MOVIE_VERSION, flags, frame_count))
+            file.write(self.inputs)
+            if self.frame_hashes:
+                file.write(b''.join(self.hashes[:frame_count]))
+
+
+class MoviePlayer:
+    """
+    replays a movie recorded by MovieRecorder, feeding the joypads instead of the frontend
+    every rendered frame is checked against the recorded hash, the first frame that differs is kept
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        magic, version, flags, self.frame_count = HEADER.unpack_from(data)
+        if magic != MOVIE_MAGIC:
+            raise Exception("Not a movie file", path)
+        if version != MOVIE_VERSION:
+            raise Exception("Movie version not supported", version)
+
+        inputs_end = HEADER.size + self.frame_count * 2
+        self.inputs = data[HEADER.size: inputs_end]
+
+        self.hashes = []
+        if flags & HAS_FRAME_HASHES:
+            self.hashes = [data[i: i + HASH_SIZE] for i in range(inputs_end, len(data), HASH_SIZE)]
+
+        self.input_index = 0
+        self.checked_frames = 0
+        self.first_mismatch = None
+
+    def finished(self) -> bool:
+        return self.input_index >= self.frame_count
+
+    def apply_input(self, io_regs: IO_Registers):
+        if self.finished():
+            return
+
+        io_regs.joypad1.button_status = self.inputs[self.input_index * 2]
+        io_regs.joypad2.button_status = self.inputs[self.input_index * 2 + 1]
+        self.input_index += 1
+
+    def write_frame(self, frame: Frame):
+        # frames past the recorded hashes have nothing to be checked against and aren't counted
+        frame_index = self.checked_frames
+        if frame_index >= len(self.hashes):
+            return
+
+        self.checked_frames += 1
+        if self.first_mismatch is None and hash_frame(frame) != self.hashes[frame_index]:
+            self.first_mismatch = frame_index
+
+    def close(self):
+        pass
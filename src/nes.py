@@ -0,0 +1,86 @@
+from bus import Bus
+from cpu import CPU
+from io_registers import IO_Registers
+from ppu.ppu import PPU
+from ppu.tile_cache import TileCache
+from ram import RAM
+from rom import ROM
+from savestate import save_state, load_state, state_hash
+
+
+class NES:
+    """
+    a whole machine driven frame by frame, for programs that explore games: searches, bots, input tests
+
+    run_frames runs up to a vblank and returns, the joypads keep the buttons given with set_buttons
+    fork makes an independent machine at the same point, it shares what never changes with this one
+    (ROM, decoded tiles, instructions) and only copies the state, through a save state
+    """
+
+    def __init__(self, rom: ROM, tile_cache: TileCache = None, instructions: dict = None):
+        self.rom = rom
+        self.ram = RAM()
+        self.ppu = PPU(rom.chr_rom, rom.screen_mirroring, tile_cache)
+        self.io_regs = IO_Registers()
+        self.bus = Bus(self.ram, self.ppu, self.io_regs, rom)
+        self.cpu = CPU(self.bus, instructions=instructions)
+        self.cpu.start_up(self.end_frame, self.handle_input)
+
+        self.started = False
+        self.frame_count = 0
+        # frames left in the current run_frames
+        self.remaining = 0
+
+    @classmethod
+    def from_bytes(cls, rom_bytes: bytes) -> 'NES':
+        return cls(ROM(rom_bytes))
+
+    def run_frames(self, frames: int = 1):
+        """
+        runs until the vblank of the given number of frames from now, the first call powers the machine on
+        """
+        if frames <= 0:
+            return
+
+        self.remaining = frames
+        self.cpu.running = True
+
+        if self.started:
+            self.cpu.run()
+        else:
+            self.started = True
+            self.cpu.run_rom(self.rom)
+
+    def end_frame(self):
+        self.frame_count += 1
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.cpu.running = False
+
+    def handle_input(self):
+        # set_buttons writes the joypads directly, they're only read between run_frames
+        pass
+
+    def set_buttons(self, button_status: int, joypad: int = 1):
+        """
+        button status of a joypad from now on, see Joypad.JoypadButton
+        """
+        joypad = self.io_regs.joypad1 if joypad == 1 else self.io_regs.joypad2
+        joypad.button_status = button_status & 0xFF
+
+    def state_hash(self) -> bytes:
+        """
+        equal for machines in lockstep, see savestate.state_hash
+        """
+        return state_hash(self.cpu)
+
+    def fork(self) -> 'NES':
+        child = NES(self.rom, tile_cache=self.ppu.tile_cache, instructions=self.cpu.instructions)
+        if self.started:
+            load_state(child.cpu, save_state(self.cpu))
+            child.cpu.rom = self.rom
+            child.cpu.reset_vector = self.cpu.reset_vector
+
+        child.started = self.started
+        child.frame_count = self.frame_count
+        return child
@@ -0,0 +1,125 @@
+from time import perf_counter, sleep
+from apu import APU
+
+NTSC_FRAME_RATE = 60.0988
+
+
+class FramePacer:
+    """
+    keeps emulation at the speed of a NES
+
+    should_render is called once per emulated frame and tells whether the frame should be rendered:
+    when the host has fallen behind, up to max_frame_skip frames in a row are emulated without being rendered
+    wait is called after presenting a frame and sleeps until its deadline when running ahead
+    """
+
+    def __init__(self, frame_rate: float = NTSC_FRAME_RATE, max_frame_skip: int = 4):
+        self.frame_time = 1 / frame_rate
+        self.max_frame_skip = max_frame_skip
+        self.deadline = None
+
+        self.frame_count = 0
+        self.skipped_frames = 0
+        self.skipped_in_a_row = 0
+
+    def should_render(self) -> bool:
+        now = perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+
+        self.deadline += self.frame_time
+        self.frame_count += 1
+
+        if now > self.deadline and self.skipped_in_a_row < self.max_frame_skip:
+            self.skipped_in_a_row += 1
+            self.skipped_frames += 1
+            return False
+
+        self.skipped_in_a_row = 0
+        return True
+
+    def wait(self):
+        remaining = self.deadline - perf_counter()
+
+        if remaining < -self.frame_time * (self.max_frame_skip + 1):
+            # too far behind to ever catch up, start counting from now instead of skipping forever
+            self.deadline = perf_counter()
+            return
+
+        # sleep is only precise to about a millisecond, the rest is spent spinning
+        if remaining > 0.002:
+            sleep(remaining - 0.001)
+
+        while perf_counter() < self.deadline:
+            pass
+
+    def reset(self):
+        """
+        starts counting deadlines from the next frame, after emulation ran unpaced for a while
+        """
+        self.deadline = None
+        self.skipped_in_a_row = 0
+
+
+class FastForward:
+    """
+    runs emulation as fast as the host allows: only every render_interval-th frame is rendered and presented,
+    nothing waits and no sound is synthesized, the APU still runs so timing and IRQs don't change
+
+    it stands in for the pacer while active, same interface as FramePacer
+    start with a number of frames stops by itself after them, to skip the intro of automated runs
+    """
+
+    def __init__(self, apu: APU, pacer: FramePacer = None, render_interval: int = 8):
+        self.apu = apu
+        self.pacer = pacer
+        self.render_interval = max(1, render_interval)
+        self.active = False
+        # frames left before stopping, 0 runs until stop
+        self.remaining = 0
+        self.synthesize = apu.synthesize
+
+        self.frame_count = 0
+        self.skipped_frames = 0
+
+    def start(self, frames: int = 0):
+        if not self.active:
+            self.synthesize = self.apu.synthesize
+            self.apu.synthesize = False
+
+        self.active = True
+        self.remaining = frames
+
+    def stop(self):
+        if not self.active:
+            return
+
+        self.active = False
+        self.apu.synthesize = self.synthesize
+        if self.pacer is not None:
+            self.pacer.reset()
+
+    def toggle(self):
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def should_render(self) -> bool:
+        self.frame_count += 1
+
+        if self.remaining:
+            self.remaining -= 1
+            if not self.remaining:
+                # the last frame is always shown
+                self.stop()
+                return True
+
+        if self.frame_count % self.render_interval:
+            self.skipped_frames += 1
+            return False
+
+        return True
+
+    def wait(self):
+        pass
@@ -1,7 +1,3 @@
-from collections import OrderedDict
-from enum import Enum
-
-
 class PPUControlReg:
     """
     7  bit  0
@@ -22,47 +18,39 @@ class PPUControlReg:
                 vertical blanking interval (0: off; 1: on)
     """
 
-    class StatusTypes(Enum):
-        nametable1 = 0 # N
-        nametable2 = 1 # N
-        ram_increment = 2 # I
-        sprite_pattern_addr = 3  # S
-        background_pattern_addr = 4 # B
-        sprite_size = 5 # H
-        master_slave = 6  # P
-        vblank = 7  # V
+    class StatusTypes:
+        nametable = 0b00000011  # N
+        ram_increment = 0b00000100  # I
+        sprite_pattern_addr = 0b00001000  # S
+        background_pattern_addr = 0b00010000  # B
+        sprite_size = 0b00100000  # H
+        master_slave = 0b01000000  # P
+        vblank = 0b10000000  # V
 
     def __init__(self):
-        self.bits = OrderedDict([
-            (PPUControlReg.StatusTypes.nametable1, False),
-            (PPUControlReg.StatusTypes.nametable2, False),
-            (PPUControlReg.StatusTypes.ram_increment, False),
-            (PPUControlReg.StatusTypes.sprite_pattern_addr, False),
-            (PPUControlReg.StatusTypes.background_pattern_addr, False),
-            (PPUControlReg.StatusTypes.sprite_size, False),
-            (PPUControlReg.StatusTypes.master_slave, False),
-            (PPUControlReg.StatusTypes.vblank, False),
-        ])
+        self.value = 0
+
+        # fields derived from value, refreshed on every write
+        self.nametable_addr = 0x2000
+        self.ram_increment = 1
+        self.sprite_pattern_addr = 0
+        self.background_pattern_addr = 0
+        self.sprite16 = False
+        self.generate_nmi = False
 
     def to_int(self) -> int:
-        value = 0
-        for i, bit in enumerate(self.bits.values()):
-            value += int(bit) << i
-        return value
+        return self.value
 
     def from_int(self, value: int):
-        for i in self.bits:
-            self.bits[i] = (value & (1 << i.value)) > 0
+        self.value = value & 0xFF
 
-    def get_nametable_addr(self):
-        nametable_bits = self.to_int() & 0b11
         # (0 = $2000; 1 = $2400; 2 = $2800; 3 = $2C00)
-        if nametable_bits == 0:
-            return 0x2000
-        elif nametable_bits == 1:
-            return 0x2400
-        elif nametable_bits == 2:
-            return 0x2800
-        else:
-            return 0x2C00
+        self.nametable_addr = 0x2000 + (value & PPUControlReg.StatusTypes.nametable) * 0x400
+        self.ram_increment = 32 if value & PPUControlReg.StatusTypes.ram_increment else 1
+        self.sprite_pattern_addr = 0x1000 if value & PPUControlReg.StatusTypes.sprite_pattern_addr else 0
+        self.background_pattern_addr = 0x1000 if value & PPUControlReg.StatusTypes.background_pattern_addr else 0
+        self.sprite16 = bool(value & PPUControlReg.StatusTypes.sprite_size)
+        self.generate_nmi = bool(value & PPUControlReg.StatusTypes.vblank)
 
+    def get_nametable_addr(self):
+        return self.nametable_addr
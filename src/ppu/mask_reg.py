@@ -1,7 +1,3 @@
-from collections import OrderedDict
-from enum import Enum
-
-
 class PPUMaskReg:
     """
     7  bit  0
@@ -18,34 +14,32 @@ class PPUMaskReg:
     +--------- Emphasize blue
     """
 
-    class StatusTypes(Enum):
-        greyscale = 0 # G
-        background_left = 1 # m
-        sprites_left = 2 # M
-        show_background = 3  # b
-        show_sprites = 4 # s
-        emphasize_red = 5 # R
-        emphasize_green = 6  # G
-        emphasize_blue = 7  # B
+    class StatusTypes:
+        greyscale = 0b00000001  # G
+        background_left = 0b00000010  # m
+        sprites_left = 0b00000100  # M
+        show_background = 0b00001000  # b
+        show_sprites = 0b00010000  # s
+        emphasize_red = 0b00100000  # R
+        emphasize_green = 0b01000000  # G
+        emphasize_blue = 0b10000000  # B
 
     def __init__(self):
-        self.bits = OrderedDict([
-            (PPUMaskReg.StatusTypes.greyscale, False),
-            (PPUMaskReg.StatusTypes.background_left, False),
-            (PPUMaskReg.StatusTypes.sprites_left, False),
-            (PPUMaskReg.StatusTypes.show_background, False),
-            (PPUMaskReg.StatusTypes.show_sprites, False),
-            (PPUMaskReg.StatusTypes.emphasize_red, False),
-            (PPUMaskReg.StatusTypes.emphasize_green, False),
-            (PPUMaskReg.StatusTypes.emphasize_blue, False)
-        ])
+        self.value = 0
+
+        # fields derived from value, refreshed on every write
+        self.background_left = False
+        self.sprites_left = False
+        self.show_background = False
+        self.show_sprites = False
 
     def to_int(self) -> int:
-        value = 0
-        for i, bit in enumerate(self.bits.values()):
-            value += int(bit) << i
-        return value
+        return self.value
 
     def from_int(self, value: int):
-        for i in self.bits:
-            self.bits[i] = (value & (1 << i.value)) > 0
+        self.value = value & 0xFF
+
+        self.background_left = bool(value & PPUMaskReg.StatusTypes.background_left)
+        self.sprites_left = bool(value & PPUMaskReg.StatusTypes.sprites_left)
+        self.show_background = bool(value & PPUMaskReg.StatusTypes.show_background)
+        self.show_sprites = bool(value & PPUMaskReg.StatusTypes.show_sprites)
@@ -0,0 +1,20 @@
+class Mirroring:
+    """
+    nametable layouts
+    PAGES maps each mode to the VRAM page (1KB) used by each of the 4 nametables: $2000, $2400, $2800, $2C00
+    four screen needs the extra 2KB of VRAM that the cartridge provides
+    """
+
+    HORIZONTAL = 0
+    VERTICAL = 1
+    SINGLE_SCREEN_LOWER = 2
+    SINGLE_SCREEN_UPPER = 3
+    FOUR_SCREEN = 4
+
+    PAGES = {
+        HORIZONTAL: (0, 0, 1, 1),
+        VERTICAL: (0, 1, 0, 1),
+        SINGLE_SCREEN_LOWER: (0, 0, 0, 0),
+        SINGLE_SCREEN_UPPER: (1, 1, 1, 1),
+        FOUR_SCREEN: (0, 1, 2, 3),
+    }
@@ -2,7 +2,9 @@ from src.frame import Frame
 from src.memory_owner import MemoryOwner
 from src.ppu.control_reg import PPUControlReg
 from src.ppu.mask_reg import PPUMaskReg
+from src.ppu.mirroring import Mirroring
 from src.ppu.status_reg import PPUStatusReg
+from src.ppu.tile_cache import TileCache
 
 
 class PPU(MemoryOwner):
@@ -33,18 +35,25 @@ class PPU(MemoryOwner):
         (0x99, 0xFF, 0xFC), (0xDD, 0xDD, 0xDD), (0x11, 0x11, 0x11), (0x11, 0x11, 0x11)
     ]
 
-    def __init__(self, chr_rom: bytes, screen_mirroring: int):
+    SCANLINE_MASK = (1 << 256) - 1
+
+    def __init__(self, chr_rom: bytes, screen_mirroring: int, tile_cache: TileCache = None):
         super().__init__(0x2000, 0x3FFF)
 
         self.chr_rom = chr_rom
+        # decoding is the slow part of creating a PPU, PPUs of the same ROM can share it
+        self.tile_cache = tile_cache or TileCache(chr_rom)
         self.palette_table = [0] * 32
-        self.ram = [0] * 2048
+        # four screen cartridges bring their own 2KB for the extra nametables
+        self.ram = [0] * (4096 if screen_mirroring == Mirroring.FOUR_SCREEN else 2048)
         self.oam_data = [0] * 256
 
         self.addr_reg = [0, 0]  # high, low
         self.addr_reg_pointer = 0
         self.internal_data_buf = 0
-        self.mirror_mode = screen_mirroring  # 0: horizontal - 1: vertical
+        self.mirror_mode = screen_mirroring
+        self.nametable_pages = [0, 0, 0, 0]  # ram offset of each nametable
+        self.set_mirroring(screen_mirroring)
         self.control_reg = PPUControlReg()
         self.status_reg = PPUStatusReg()
         self.mask_reg = PPUMaskReg()
@@ -54,9 +63,14 @@ class PPU(MemoryOwner):
         self.scroll_reg = [0, 0]  # x, y
         self.scroll_reg_pointer = 0
 
+        self.clock = 0  # total PPU cycles run so far
         self.current_cycle = 0
         self.scanline = 0
         self.nmi_interrupt = False
+        self.sprite_0_hit_clock = None
+
+        # opaque background pixels of the last rendered frame, one int per scanline (bit x = pixel x)
+        self.background_mask = [0] * 240
 
     def get_and_update_nmi(self):
         cur_value = self.nmi_interrupt
@@ -64,9 +78,7 @@ class PPU(MemoryOwner):
         return cur_value
 
     def increment_ram_addr(self):
-        inc = 32 if self.control_reg.bits[PPUControlReg.StatusTypes.ram_increment] else 1
-
-        self.set_addr_reg(self.get_addr_reg() + inc)
+        self.set_addr_reg(self.get_addr_reg() + self.control_reg.ram_increment)
 
     def set_addr_reg(self, value):
         self.addr_reg[0] = (value >> 8) & 0x3F
@@ -75,22 +87,16 @@ class PPU(MemoryOwner):
     def get_addr_reg(self):
         return self.addr_reg[0] << 8 | self.addr_reg[1]
 
-    def mirror_ram_addr(self, addr: int) -> int:
-        mirrored_ram = addr & 0b00101111_11111111  # mirror down 0x3000-0x3eff to 0x2000 - 0x2eff
-        ram_index = mirrored_ram - 0x2000
-
-        name_table = ram_index // 0x400
-
-        if self.mirror_mode == 0:  # horizontal
-            if name_table == 1 or name_table == 2:
-                return ram_index - 0x400
-            elif name_table == 3:
-                return ram_index - 0x800
-        elif self.mirror_mode == 1:  # vertical
-            if name_table == 2 or name_table == 3:
-                return ram_index - 0x800
+    def set_mirroring(self, mirror_mode: int):
+        """
+        rebuilds the nametable lookup, cheap enough for mappers that switch mirroring at runtime
+        """
+        self.mirror_mode = mirror_mode
+        self.nametable_pages = [page * 0x400 for page in Mirroring.PAGES[mirror_mode]]
 
-        return ram_index
+    def mirror_ram_addr(self, addr: int) -> int:
+        # 0x3000-0x3eff mirrors 0x2000-0x2eff, bits 10 and 11 select the nametable
+        return self.nametable_pages[(addr >> 10) & 0b11] | (addr & 0x3FF)
 
     def write_to_data(self, value):
         addr = self.get_addr_reg()
@@ -160,8 +166,8 @@ class PPU(MemoryOwner):
         if position in [0x2000, 0x2001, 0x2003, 0x2005, 0x2006, 0x4014]:
             raise Exception("Trying to read write-only PPU address:", hex(position))
         elif position == 0x2002:
-            value = self.status_reg.to_int()
-            self.status_reg.bits[PPUStatusReg.StatusTypes.vblank] = 0
+            value = self.status_reg.value
+            self.status_reg.value = value & ~PPUStatusReg.StatusTypes.vblank
             self.addr_reg_pointer = 0
             self.scroll_reg_pointer = 0
             return value
@@ -176,50 +182,155 @@ class PPU(MemoryOwner):
         return super().get(position)
 
     def update_control_reg(self, value: int):
-        current_nmi_status = self.control_reg.bits[PPUControlReg.StatusTypes.vblank]
+        current_nmi_status = self.control_reg.generate_nmi
         self.control_reg.from_int(value)
-        new_nmi_status = self.control_reg.bits[PPUControlReg.StatusTypes.vblank]
-        if not current_nmi_status and new_nmi_status and self.status_reg.bits[PPUStatusReg.StatusTypes.vblank] == 1:
+        new_nmi_status = self.control_reg.generate_nmi
+        if not current_nmi_status and new_nmi_status and self.status_reg.value & PPUStatusReg.StatusTypes.vblank:
             self.nmi_interrupt = True
 
     def update_mask_reg(self, value: int):
         self.mask_reg.from_int(value)
 
-    def tick(self, cycles: int) -> bool:
+    def catch_up(self, clock: int) -> bool:
         """
-        returns bool indicating if PPU has entered vblank
+        runs the PPU up to the given clock (3 PPU cycles per CPU cycle)
+        returns bool indicating if PPU has entered vblank on the way
         """
+        cycles = clock - self.clock
+        if cycles <= 0:
+            return False
+
+        self.clock = clock
+        start_cycle = self.current_cycle
         self.current_cycle += cycles
 
-        if 257 <= self.current_cycle <= 320:
+        # OAMADDR is reset during cycles 257-320 of every scanline
+        if start_cycle <= 320 and self.current_cycle >= 257 or self.current_cycle >= 341 + 257:
             self.oam_address_reg = 0
 
-        if self.current_cycle >= 341:
-            if self.scanline < 241 and self.is_sprite_0_hit():
-                self.status_reg.bits[PPUStatusReg.StatusTypes.sprite_0_hit] = 1
+        entered_vblank = False
+        # clock at the start of the current scanline
+        line_clock = clock - self.current_cycle
 
-            self.current_cycle %= 341
+        while self.current_cycle >= 341:
+            if self.sprite_0_hit_clock is not None and self.sprite_0_hit_clock < line_clock + 341:
+                self.set_sprite_0_hit()
+
+            line_clock += 341
+            self.current_cycle -= 341
             self.scanline += 1
 
             if self.scanline == 241:
-                self.status_reg.bits[PPUStatusReg.StatusTypes.vblank] = 1
-                if self.control_reg.bits[PPUControlReg.StatusTypes.vblank]:
+                self.status_reg.value |= PPUStatusReg.StatusTypes.vblank
+                if self.control_reg.generate_nmi:
                     self.nmi_interrupt = True
-                return True
+                entered_vblank = True
 
             elif self.scanline >= 262:
                 self.scanline = 0
-                self.status_reg.bits[PPUStatusReg.StatusTypes.sprite_0_hit] = 0
-                self.status_reg.bits[PPUStatusReg.StatusTypes.vblank] = 0
+                self.status_reg.value &= ~(PPUStatusReg.StatusTypes.sprite_0_hit | PPUStatusReg.StatusTypes.vblank)
                 self.nmi_interrupt = False
+                self.sprite_0_hit_clock = self.find_sprite_0_hit(line_clock)
+
+        if self.sprite_0_hit_clock is not None and self.sprite_0_hit_clock <= clock:
+            self.set_sprite_0_hit()
+
+        return entered_vblank
+
+    def next_event_clock(self) -> int:
+        """
+        clock of the next scheduled event: the start of vblank, the sprite 0 hit if it comes first,
+        or the start of the next frame while in vblank, where the hit of that frame is found
+        """
+        if self.scanline >= 241:
+            return self.clock + (262 - self.scanline) * 341 - self.current_cycle
+
+        vblank_clock = self.clock + (241 - self.scanline) * 341 - self.current_cycle
+        if self.sprite_0_hit_clock is not None and self.sprite_0_hit_clock < vblank_clock:
+            return self.sprite_0_hit_clock
+
+        return vblank_clock
+
+    def set_sprite_0_hit(self):
+        if self.mask_reg.show_sprites and self.mask_reg.show_background:
+            self.status_reg.value |= PPUStatusReg.StatusTypes.sprite_0_hit
+
+        self.sprite_0_hit_clock = None
+
+    def find_sprite_0_hit(self, frame_clock: int):
+        """
+        finds the first pixel where an opaque pixel of sprite 0 overlaps an opaque background pixel
+        returns the clock at which the hit happens in the frame starting at frame_clock, or None if it never does
+        computed once per frame, any register write that could move the hit happens before the frame starts
+        """
+        tile_y = self.oam_data[0]
+        if tile_y >= 0xEF:
+            return None
+
+        tile_index = self.oam_data[1]
+        attributes = self.oam_data[2]
+        tile_x = self.oam_data[3]
+
+        sprite16 = self.control_reg.sprite16
+        sprite_height = 16 if sprite16 else 8
+        flip_vertical = attributes >> 7 & 1
+        masks = self.tile_cache.flipped_masks if attributes >> 6 & 1 else self.tile_cache.masks
+
+        # a hit never happens at x = 255, nor in the leftmost 8 pixels when either of them is clipped
+        allowed_mask = PPU.SCANLINE_MASK >> 1
+        if not (self.mask_reg.background_left and self.mask_reg.sprites_left):
+            allowed_mask &= ~0xFF
+
+        for row in range(sprite_height):
+            line = tile_y + 1 + row
+            if line >= 240:
+                break
+
+            sprite_row = sprite_height - 1 - row if flip_vertical else row
+            sprite_mask = (masks[self.get_sprite_cache_index(tile_index, sprite_row, sprite16)] << tile_x) & allowed_mask
+            if not sprite_mask:
+                continue
+
+            hit_mask = sprite_mask & self.get_background_opacity(line, tile_x)
+            if hit_mask:
+                hit_x = (hit_mask & -hit_mask).bit_length() - 1
+                return frame_clock + line * 341 + hit_x + 1
+
+        return None
+
+    def get_background_opacity(self, line: int, x: int) -> int:
+        """
+        opacity of the background pixels x to x + 7 of a scanline, bit n is pixel n of the screen
+        follows the same nametable placement as render_background
+        """
+        # main, right, below and diagonal, indexed by which edges the pixel is past
+        nametables = self.get_scrolled_nametables()
+        scroll_x = self.scroll_reg[0]
+        scroll_y = self.scroll_reg[1]
+
+        bank_tile = self.control_reg.background_pattern_addr >> 4
+        tile_masks = self.tile_cache.masks
+
+        opacity = 0
+        for pixel_x in range(x, min(x + 8, 256)):
+            world_x = pixel_x + scroll_x
+            world_y = line + scroll_y
+            nametable = 0
 
-        return False
+            if world_x >= 256:
+                world_x -= 256
+                nametable |= 0b01
+            if world_y >= 240:
+                world_y -= 240
+                nametable |= 0b10
 
-    def is_sprite_0_hit(self) -> bool:
-        y = self.oam_data[0]
-        x = self.oam_data[3]
-        return y == self.scanline and x <= self.current_cycle and self.mask_reg.bits[
-            PPUMaskReg.StatusTypes.show_sprites] and self.mask_reg.bits[PPUMaskReg.StatusTypes.show_background]
+            nametable_addr = nametables[nametable]
+
+            tile_index = self.ram[nametable_addr + (world_y // 8) * 32 + world_x // 8]
+            if tile_masks[(bank_tile + tile_index) * 8 + (world_y & 7)] >> (world_x & 7) & 1:
+                opacity |= 1 << pixel_x
+
+        return opacity
 
     def get_background_palette(self, column: int, row: int, attribute_table_addr: int):
         # https://www.nesdev.org/wiki/PPU_attribute_tables
@@ -260,123 +371,170 @@ class PPU(MemoryOwner):
         ]
 
     def render(self, frame: Frame):
-        frame.pixels_to_update = []
-        if self.mask_reg.bits[PPUMaskReg.StatusTypes.show_background]:
+        self.background_mask = [0] * 240
+        if self.mask_reg.show_background:
             self.render_background(frame)
+        else:
+            # the backdrop shows everywhere, nothing of the previous frame may stay
+            frame.fill(self.palette_table[0])
 
-        if self.mask_reg.bits[PPUMaskReg.StatusTypes.show_sprites]:
-            sprite_16_8 = self.control_reg.bits[PPUControlReg.StatusTypes.sprite_size]
-            self.render_sprites(frame, sprite_16_8)
+        if self.mask_reg.show_sprites:
+            self.render_sprites(frame, self.control_reg.sprite16)
 
     def render_background(self, frame: Frame):
-        nametable_address = self.control_reg.get_nametable_addr()
+        main_nametable_addr, right_nametable_addr, below_nametable_addr, diagonal_nametable_addr = \
+            self.get_scrolled_nametables()
         scroll_x = self.scroll_reg[0]
         scroll_y = self.scroll_reg[1]
 
-        vertical_mirror = self.mirror_mode == 1
-
-        main_nametable_addr = None
-        second_nametable_addr = None
-
-        if vertical_mirror:  # SMB is vertical mirror
-            if nametable_address in [0x2000, 0x2800]:
-                main_nametable_addr = 0
-                second_nametable_addr = 0x400
-            elif nametable_address in [0x2400, 0x2C00]:
-                main_nametable_addr = 0x400
-                second_nametable_addr = 0
-        else:
-            if nametable_address in [0x2000, 0x2400]:
-                main_nametable_addr = 0
-                second_nametable_addr = 0x400
-            elif nametable_address in [0x2800, 0x2C00]:
-                main_nametable_addr = 0x400
-                second_nametable_addr = 0
-
-        bank = self.control_reg.bits[PPUControlReg.StatusTypes.background_pattern_addr]
+        bank = self.control_reg.background_pattern_addr
 
         self.render_nametable(frame, bank, main_nametable_addr, [scroll_x, scroll_y, 256, 240], -scroll_x, -scroll_y)
 
+        # every pixel is drawn, so a frame only depends on the PPU state and never on the previous frame
         if scroll_x > 0:
-            self.render_nametable(frame, bank, second_nametable_addr, [0, 0, scroll_x, 240], 256 - scroll_x, 0)
-        elif scroll_y > 0:
-            self.render_nametable(frame, bank, second_nametable_addr, [0, 0, 256, scroll_y], 0, 240 - scroll_y)
+            self.render_nametable(frame, bank, right_nametable_addr, [0, scroll_y, scroll_x, 240],
+                                  256 - scroll_x, -scroll_y)
+        if scroll_y > 0:
+            self.render_nametable(frame, bank, below_nametable_addr, [scroll_x, 0, 256, scroll_y],
+                                  -scroll_x, 240 - scroll_y)
+        if scroll_x > 0 and scroll_y > 0:
+            self.render_nametable(frame, bank, diagonal_nametable_addr, [0, 0, scroll_x, scroll_y],
+                                  256 - scroll_x, 240 - scroll_y)
+
+    def get_scrolled_nametables(self) -> tuple[int, int, int, int]:
+        """
+        ram offsets of the nametable selected in PPUCTRL and of its horizontal, vertical and diagonal neighbours,
+        the ones scrolled into view next to it
+        """
+        nametable = (self.control_reg.nametable_addr >> 10) & 0b11
+
+        return (
+            self.nametable_pages[nametable],
+            self.nametable_pages[nametable ^ 0b01],
+            self.nametable_pages[nametable ^ 0b10],
+            self.nametable_pages[nametable ^ 0b11]
+        )
 
     def render_nametable(self, frame: Frame, bank: bool, nametable_start_addr: int, rect: list[int], shift_x: int, shift_y: int):
         attribute_table_addr = nametable_start_addr + 0x3c0
 
-        bank_index = 0x1000 if bank else 0
+        bank_tile = 256 if bank else 0
+        tile_pixels = self.tile_cache.pixels
+        tile_masks = self.tile_cache.masks
+
+        # opacity bits are kept in screen coordinates, this keeps only the pixels inside rect
+        visible_mask = ((1 << (rect[2] - rect[0])) - 1) << (rect[0] + shift_x)
 
         for tile_row in range(rect[1] // 8, (rect[3] // 8) + 1):
             for tile_column in range(rect[0] // 8, (rect[2] // 8) + 1):
                 tile_index = self.ram[tile_row * 32 + tile_column + nametable_start_addr]
 
-                start_position = bank_index + tile_index * 16
+                cache_index = (bank_tile + tile_index) * 8
                 palette_indexes = self.get_background_palette(tile_column, tile_row, attribute_table_addr)
 
-                for y in range(8):
-                    upper = self.chr_rom[start_position + y]
-                    lower = self.chr_rom[start_position + y + 8]
+                screen_x = shift_x + tile_column * 8
 
+                for y in range(8):
                     pixel_y = tile_row * 8 + y
 
                     if not (rect[1] <= pixel_y < rect[3]):
                         continue
 
-                    for x in range(7, -1, -1):
-                        value = ((1 & lower) << 1) | (1 & upper)
-                        upper >>= 1
-                        lower >>= 1
-
-                        rgb = PPU.SYSTEM_PALLETE[palette_indexes[value]]
+                    row_mask = tile_masks[cache_index + y]
+                    if screen_x >= 0:
+                        row_mask <<= screen_x
+                    else:
+                        row_mask >>= -screen_x
+                    self.background_mask[shift_y + pixel_y] |= row_mask & visible_mask
 
+                    for x, value in enumerate(tile_pixels[cache_index + y]):
                         pixel_x = tile_column * 8 + x
 
                         if rect[0] <= pixel_x < rect[2]:
-                            frame.set_pixel(shift_x + pixel_x, shift_y + pixel_y, rgb)
+                            frame.set_pixel(shift_x + pixel_x, shift_y + pixel_y, palette_indexes[value])
 
-    def render_sprites(self, frame: Frame, sprite16: bool):
-        bank = 0x1000 if self.control_reg.bits[PPUControlReg.StatusTypes.sprite_pattern_addr] else 0
+    def evaluate_sprites(self, sprite_height: int) -> list[list[int]]:
+        """
+        single pass over OAM bucketing the sprites by the scanlines they cover
+        keeps the hardware limit of 8 sprites per scanline, in OAM order
+        sprites with Y >= $EF are hidden and never reach a bucket
+        """
+        scanlines = [[] for _ in range(240)]
 
-        for i in range(len(self.oam_data) - 4, -1, -4):
-            tile_index = self.oam_data[i + 1]
-            tile_x = self.oam_data[i + 3]
+        for i in range(0, len(self.oam_data), 4):
             tile_y = self.oam_data[i]
+            if tile_y >= 0xEF:
+                continue
+
+            # sprite data is delayed by one scanline
+            top = tile_y + 1
+            for line in range(top, min(top + sprite_height, 240)):
+                bucket = scanlines[line]
+                if len(bucket) < 8:
+                    bucket.append(i)
+
+        return scanlines
+
+    def get_sprite_cache_index(self, tile_index: int, row: int, sprite16: bool) -> int:
+        """
+        tile cache index of a row of a sprite, row is already flipped vertically
+        8x16 sprites take the pattern table from bit 0 of the tile index instead of PPUCTRL
+        """
+        if sprite16:
+            return ((tile_index & 1) * 256 + (tile_index & 0xFE) + (row >> 3)) * 8 + (row & 7)
 
-            flip_vertical = self.oam_data[i + 2] >> 7 & 1
-            flip_horizontal = self.oam_data[i + 2] >> 6 & 1
+        bank_tile = self.control_reg.sprite_pattern_addr >> 4
+        return (bank_tile + tile_index) * 8 + row
 
-            palette_index = self.oam_data[i + 2] & 0b11
-            sprite_palette = self.get_sprite_palette(palette_index)
+    def render_sprites(self, frame: Frame, sprite16: bool):
+        sprite_height = 16 if sprite16 else 8
+        cache = self.tile_cache
+
+        for line, bucket in enumerate(self.evaluate_sprites(sprite_height)):
+            if not bucket:
+                continue
 
-            start_position = bank + tile_index * 16
+            background = self.background_mask[line]
+            # pixels already taken by a sprite with lower OAM index, even if it is behind the background
+            covered = 0
 
-            for y in range(8):
-                upper = self.chr_rom[start_position + y]
-                lower = self.chr_rom[start_position + y + 8]
+            for i in bucket:
+                tile_index = self.oam_data[i + 1]
+                attributes = self.oam_data[i + 2]
+                tile_x = self.oam_data[i + 3]
 
-                final_y = tile_y + y
+                flip_vertical = attributes >> 7 & 1
+                flip_horizontal = attributes >> 6 & 1
+                behind_background = attributes >> 5 & 1
+
+                row = line - self.oam_data[i] - 1
                 if flip_vertical:
-                    final_y = tile_y + 7 - y
+                    row = sprite_height - 1 - row
 
-                for x in range(7, -1, -1):
-                    value = ((1 & lower) << 1) | (1 & upper)
-                    upper >>= 1
-                    lower >>= 1
+                cache_index = self.get_sprite_cache_index(tile_index, row, sprite16)
 
-                    rgb = (0, 0, 0)
-                    if value == 0:
-                        continue
-                    elif value == 1:
-                        rgb = PPU.SYSTEM_PALLETE[sprite_palette[1]]
-                    elif value == 2:
-                        rgb = PPU.SYSTEM_PALLETE[sprite_palette[2]]
-                    elif value == 3:
-                        rgb = PPU.SYSTEM_PALLETE[sprite_palette[3]]
+                if flip_horizontal:
+                    row_mask = cache.flipped_masks[cache_index]
+                else:
+                    row_mask = cache.masks[cache_index]
+
+                if not row_mask:
+                    continue
+
+                # sprites hanging off the right edge are clipped, they don't wrap
+                row_mask = (row_mask << tile_x) & ~covered & PPU.SCANLINE_MASK
+                covered |= row_mask
+
+                if behind_background:
+                    row_mask &= ~background
 
-                    final_x = tile_x + x
+                if not row_mask:
+                    continue
 
-                    if flip_horizontal:
-                        final_x = tile_x + 7 - x
+                pixels = cache.flipped_pixels[cache_index] if flip_horizontal else cache.pixels[cache_index]
+                sprite_palette = self.get_sprite_palette(attributes & 0b11)
 
-                    frame.set_pixel(final_x, final_y, rgb)
+                for x in range(8):
+                    if row_mask >> (tile_x + x) & 1:
+                        frame.set_pixel(tile_x + x, line, sprite_palette[pixels[x]])
@@ -1,7 +1,3 @@
-from collections import OrderedDict
-from enum import Enum
-
-
 class PPUStatusReg:
     """
     7  bit  0
@@ -26,34 +22,16 @@ class PPUStatusReg:
                 pre-render line.
     """
 
-    class StatusTypes(Enum):
-        unused0 = 0  # 
-        unused1 = 1  # 
-        unused2 = 2  # 
-        unused3 = 3  # 
-        unused4 = 4 #
-        overflow = 5 # O
-        sprite_0_hit = 6  # S
-        vblank = 7  # V
+    class StatusTypes:
+        overflow = 0b00100000  # O
+        sprite_0_hit = 0b01000000  # S
+        vblank = 0b10000000  # V
 
     def __init__(self):
-        self.bits = OrderedDict([
-            (PPUStatusReg.StatusTypes.unused0, False),
-            (PPUStatusReg.StatusTypes.unused1, False),
-            (PPUStatusReg.StatusTypes.unused2, False),
-            (PPUStatusReg.StatusTypes.unused3, False),
-            (PPUStatusReg.StatusTypes.unused4, False),
-            (PPUStatusReg.StatusTypes.overflow, True),
-            (PPUStatusReg.StatusTypes.sprite_0_hit, False),
-            (PPUStatusReg.StatusTypes.vblank, True)
-        ])
+        self.value = PPUStatusReg.StatusTypes.overflow | PPUStatusReg.StatusTypes.vblank
 
     def to_int(self) -> int:
-        value = 0
-        for i, bit in enumerate(self.bits.values()):
-            value += int(bit) << i
-        return value
+        return self.value
 
     def from_int(self, value: int):
-        for i in self.bits:
-            self.bits[i] = (value & (1 << i.value)) > 0
+        self.value = value & 0xFF
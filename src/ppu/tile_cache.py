@@ -0,0 +1,34 @@
+class TileCache:
+    """
+    CHR pattern tables decoded once per ROM
+
+    every tile has 8 rows, each row is stored at index tile * 8 + row as:
+    - pixels: tuple with the 2 bit color value of the 8 pixels, left to right
+    - mask: opacity bits of the row, bit 0 is the leftmost pixel
+    horizontally flipped rows are kept in separate lists so sprites never have to flip at render time
+    """
+
+    def __init__(self, chr_rom: bytes):
+        self.num_tiles = len(chr_rom) // 16
+
+        self.pixels: list[tuple] = []
+        self.masks: list[int] = []
+        self.flipped_pixels: list[tuple] = []
+        self.flipped_masks: list[int] = []
+
+        for tile in range(self.num_tiles):
+            start_position = tile * 16
+            for y in range(8):
+                upper = chr_rom[start_position + y]
+                lower = chr_rom[start_position + y + 8]
+
+                pixels = tuple(((upper >> (7 - x)) & 1) | (((lower >> (7 - x)) & 1) << 1) for x in range(8))
+                mask = 0
+                for x in range(8):
+                    if pixels[x]:
+                        mask |= 1 << x
+
+                self.pixels.append(pixels)
+                self.masks.append(mask)
+                self.flipped_pixels.append(pixels[::-1])
+                self.flipped_masks.append(int('{:08b}'.format(mask)[::-1], 2))
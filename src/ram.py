@@ -9,5 +9,23 @@ class RAM(MemoryOwner):
     $1800 - $1FFF   -> Mirror of $0000-$07FF
     '''
 
+    SIZE = 0x800
+
     def __init__(self):
         super().__init__(0x0000, 0x1FFF)
+        # only the 2KB exist, the mirrors are folded onto them
+        self.memory = bytearray(RAM.SIZE)
+
+    def get(self, position: int) -> int:
+        return self.memory[position & 0x7FF]
+
+    def get_bytes(self, position: int, size: int = 1) -> bytes:
+        start = position & 0x7FF
+        if start + size <= RAM.SIZE:
+            return bytes(self.memory[start: start + size])
+
+        return bytes((self.memory + self.memory)[start: start + size])
+
+    def set(self, position: int, value: int, size: int = 1):
+        for i in range(size):
+            self.memory[(position + i) & 0x7FF] = (value >> (8 * i)) & 255
@@ -0,0 +1,135 @@
+import os
+import sys
+import wave
+from apu import SAMPLE_RATE
+from frame import Frame
+from ppu.ppu import PPU
+
+# NTSC frame rate as a fraction, 60.0988 fps
+FRAME_RATE_NUMERATOR = 39375000
+FRAME_RATE_DENOMINATOR = 655171
+
+
+def color_lookup_tables() -> tuple[bytes, bytes, bytes]:
+    """
+    Y, Cb and Cr (BT.601, limited range) of every system palette index
+    as 256 byte tables so a whole frame is converted with bytes.translate
+    """
+    y_table = bytearray(256)
+    cb_table = bytearray(256)
+    cr_table = bytearray(256)
+
+    for index in range(256):
+        r, g, b = PPU.SYSTEM_PALLETE[index & 0x3F]
+        y_table[index] = round(16 + (65.481 * r + 128.553 * g + 24.966 * b) / 255)
+        cb_table[index] = round(128 + (-37.797 * r - 74.203 * g + 112.0 * b) / 255)
+        cr_table[index] = round(128 + (112.0 * r - 93.786 * g - 18.214 * b) / 255)
+
+    return bytes(y_table), bytes(cb_table), bytes(cr_table)
+
+
+class Y4MRecorder:
+    """
+    streams frames to a YUV4MPEG2 file
+    4:4:4 chroma, so every plane is the frame translated through one lookup table
+    """
+
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb', buffering=Y4MRecorder.BUFFER_SIZE)
+        self.y_table, self.cb_table, self.cr_table = color_lookup_tables()
+        self.frame_count = 0
+
+        self.file.write('YUV4MPEG2 W{} H{} F{}:{} Ip A1:1 C444\n'.format(
+            Frame.WIDTH, Frame.HEIGHT, FRAME_RATE_NUMERATOR, FRAME_RATE_DENOMINATOR).encode())
+
+    def write_frame(self, frame: Frame):
+        data = bytes(frame.data)
+
+        self.file.write(b'FRAME\n')
+        self.file.write(data.translate(self.y_table))
+        self.file.write(data.translate(self.cb_table))
+        self.file.write(data.translate(self.cr_table))
+        self.frame_count += 1
+
+    def close(self):
+        self.file.close()
+
+
+class PNGSequenceRecorder:
+    """
+    writes every frame to its own indexed PNG: out.png becomes out_00000.png, out_00001.png...
+    """
+
+    def __init__(self, path: str):
+        self.path_start, _ = os.path.splitext(path)
+        self.frame_count = 0
+
+    def write_frame(self, frame: Frame):
+        # fast compression, frames are written at emulation speed
+        frame.save_png('{}_{:05d}.png'.format(self.path_start, self.frame_count), compression=1)
+        self.frame_count += 1
+
+    def close(self):
+        pass
+
+
+class WAVRecorder:
+    """
+    streams APU samples to a 16 bit mono WAV, the sizes in its header are filled in by close
+    """
+
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE):
+        self.file = open(path, 'wb', buffering=WAVRecorder.BUFFER_SIZE)
+        self.wave = wave.open(self.file, 'wb')
+        self.wave.setnchannels(1)
+        self.wave.setsampwidth(2)
+        self.wave.setframerate(sample_rate)
+
+    def write_samples(self, samples):
+        self.wave.writeframesraw(pcm_bytes(samples))
+
+    def close(self):
+        self.wave.close()
+        self.file.close()
+
+
+class PCMRecorder:
+    """
+    streams APU samples as raw signed 16 bit little endian mono PCM
+    """
+
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb', buffering=PCMRecorder.BUFFER_SIZE)
+
+    def write_samples(self, samples):
+        self.file.write(pcm_bytes(samples))
+
+    def close(self):
+        self.file.close()
+
+
+def pcm_bytes(samples) -> bytes:
+    if sys.byteorder == 'little':
+        return samples.tobytes()
+
+    return samples.byteswap().tobytes()
+
+
+def create_audio_recorder(path: str):
+    if path.endswith('.wav'):
+        return WAVRecorder(path)
+
+    return PCMRecorder(path)
+
+
+def create_recorder(path: str):
+    if path.endswith('.png'):
+        return PNGSequenceRecorder(path)
+
+    return Y4MRecorder(path)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import tempfile
+from bus import Bus
+from cpu import CPU
+from frame import Frame
+from headless import HeadlessUI
+from io_registers import IO_Registers
+from movie import MoviePlayer, hash_frame
+from ppu.ppu import PPU
+from ram import RAM
+from rom import ROM
+
+
+class GoldenChecker:
+    """
+    compares the hash of every frame with the golden hashes, one hex hash per line in the golden file
+    the first frame that differs is kept so it can be looked at, frames past the golden ones are only hashed
+    """
+
+    def __init__(self, golden_hashes: list, stop_at_mismatch: bool = True):
+        self.golden_hashes = golden_hashes
+        self.stop_at_mismatch = stop_at_mismatch
+        self.hashes = []
+        self.first_mismatch = None
+        self.mismatch_frame = None
+        self.cpu = None
+
+    @staticmethod
+    def load(path: str) -> list:
+        with open(path) as file:
+            return [bytes.fromhex(line.strip()) for line in file if line.strip()]
+
+    def save(self, path: str):
+        with open(path, 'w') as file:
+            file.writelines(frame_hash.hex() + '\n' for frame_hash in self.hashes)
+
+    def write_frame(self, frame: Frame):
+        frame_index = len(self.hashes)
+        frame_hash = hash_frame(frame)
+        self.hashes.append(frame_hash)
+
+        if self.first_mismatch is not None or frame_index >= len(self.golden_hashes):
+            return
+
+        if frame_hash != self.golden_hashes[frame_index]:
+            self.first_mismatch = frame_index
+            self.mismatch_frame = bytes(frame.data)
+            if self.stop_at_mismatch and self.cpu is not None:
+                self.cpu.running = False
+
+    def close(self):
+        pass
+
+
+def run(rom_bytes: bytes, frames: int, checker: GoldenChecker, movie_path: str = ''):
+    """
+    runs the rom headless for the given number of frames, feeding every frame to the checker
+    input comes from the movie when given, the joypads are left alone otherwise
+    """
+    rom = ROM(rom_bytes)
+    ppu = PPU(rom.chr_rom, rom.screen_mirroring)
+    io_regs = IO_Registers()
+    bus = Bus(RAM(), ppu, io_regs, rom)
+    cpu = CPU(bus)
+    checker.cpu = cpu
+
+    movie_player = MoviePlayer(movie_path) if movie_path else None
+    if movie_player is not None and not frames:
+        frames = movie_player.frame_count
+
+    ui = HeadlessUI(ppu, io_regs, cpu, frame_callback=lambda frame: None, max_frames=frames, recorders=[checker])
+
+    def handle_input():
+        if movie_player is not None:
+            movie_player.apply_input(io_regs)
+
+    cpu.start_up(ui.update_ui_callback, handle_input)
+    cpu.run_rom(rom)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Golden frame regression check.')
+    parser.add_argument('rom_path', type=str, help='path to rom')
+    parser.add_argument('golden_path', type=str, help='file with the golden hash of every frame, one per line')
+    parser.add_argument('--frames', dest='frames', type=int, default=0,
+                        help='frames to run, defaults to the length of the movie or of the golden file')
+    parser.add_argument('--movie', dest='movie', type=str, default='', help='input movie to replay')
+    parser.add_argument('--update', dest='update', const=True, default=False,
+                        help='writes the hashes of this run as the new golden file', nargs='?')
+    # the default is outside the working directory so a run from the source tree doesn't leave it there
+    parser.add_argument('--diff-image', dest='diff_image', type=str,
+                        default=os.path.join(tempfile.gettempdir(), 'diverged.png'),
+                        help='where to write the first frame that differs')
+    args = parser.parse_args()
+
+    with open(args.rom_path, 'rb') as file:
+        rom_bytes = file.read()
+
+    golden_hashes = [] if args.update else GoldenChecker.load(args.golden_path)
+    frames = args.frames or len(golden_hashes)
+    if not frames and not args.movie:
+        parser.error('--frames is needed when there are no golden hashes or movie to take the length from')
+
+    checker = GoldenChecker(golden_hashes)
+    run(rom_bytes, frames, checker, args.movie)
+
+    if args.update:
+        checker.save(args.golden_path)
+        print('Wrote {} golden hashes to {}'.format(len(checker.hashes), args.golden_path))
+        return
+
+    if checker.first_mismatch is not None:
+        Frame(checker.mismatch_frame).save_png(args.diff_image)
+        print('Frame {} differs from the golden hash, written to {}'.format(checker.first_mismatch, args.diff_image))
+        sys.exit(1)
+
+    if len(checker.hashes) < len(golden_hashes):
+        print('Only {} of {} golden frames were rendered'.format(len(checker.hashes), len(golden_hashes)))
+        sys.exit(1)
+
+    print('All {} frames match'.format(len(checker.hashes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+from multiprocessing import Process, Queue, shared_memory
+from queue import Empty
+from frame import Frame
+from ppu.ppu import PPU
+
+VRAM_SIZE = 4096
+PALETTE_SIZE = 32
+OAM_SIZE = 256
+REGS_SIZE = 8
+
+# layout of a slot: render state written by the emulator, then the frame rendered by the worker
+VRAM_START = 0
+PALETTE_START = VRAM_START + VRAM_SIZE
+OAM_START = PALETTE_START + PALETTE_SIZE
+REGS_START = OAM_START + OAM_SIZE
+FRAME_START = REGS_START + REGS_SIZE
+SLOT_SIZE = FRAME_START + Frame.WIDTH * Frame.HEIGHT
+
+
+def write_render_state(ppu: PPU, slot: memoryview):
+    """
+    copies everything PPU.render reads into a slot: VRAM, palette, OAM, control, mask, scroll and mirroring
+    """
+    slot[VRAM_START:VRAM_START + len(ppu.ram)] = bytes(ppu.ram)
+    slot[PALETTE_START:OAM_START] = bytes(ppu.palette_table)
+    slot[OAM_START:REGS_START] = bytes(ppu.oam_data)
+    slot[REGS_START:REGS_START + 5] = bytes([
+        ppu.control_reg.to_int(),
+        ppu.mask_reg.to_int(),
+        ppu.scroll_reg[0],
+        ppu.scroll_reg[1],
+        ppu.mirror_mode
+    ])
+
+
+def read_render_state(ppu: PPU, slot: memoryview):
+    ppu.ram[:] = slot[VRAM_START:VRAM_START + len(ppu.ram)]
+    ppu.palette_table[:] = slot[PALETTE_START:OAM_START]
+    ppu.oam_data[:] = slot[OAM_START:REGS_START]
+
+    control, mask, scroll_x, scroll_y, mirror_mode = slot[REGS_START:REGS_START + 5]
+    ppu.control_reg.from_int(control)
+    ppu.mask_reg.from_int(mask)
+    ppu.scroll_reg = [scroll_x, scroll_y]
+    if mirror_mode != ppu.mirror_mode:
+        ppu.set_mirroring(mirror_mode)
+
+
+def render_loop(memory: shared_memory.SharedMemory, chr_rom: bytes, screen_mirroring: int, requests: Queue,
+                done: Queue):
+    ppu = PPU(chr_rom, screen_mirroring)
+
+    while True:
+        slot_index = requests.get()
+        if slot_index is None:
+            return
+
+        slot = memory.buf[slot_index * SLOT_SIZE: (slot_index + 1) * SLOT_SIZE]
+        read_render_state(ppu, slot)
+        # render writes every pixel, background or backdrop, so nothing the slot held before shows through
+        ppu.render(Frame(slot[FRAME_START:]))
+        done.put(slot_index)
+
+
+class RenderWorker:
+    """
+    runs PPU.render in a separate process so rendering overlaps with CPU emulation
+
+    the emulator and the worker share 3 slots of memory: at any time one holds the frame on screen,
+    one is being rendered and one is free to take the next snapshot
+    when no slot is free the snapshot is dropped, emulation never waits for the worker
+    frames come back one or two emulated frames late
+    """
+
+    SLOT_COUNT = 3
+
+    def __init__(self, chr_rom: bytes, screen_mirroring: int):
+        self.memory = shared_memory.SharedMemory(create=True, size=SLOT_SIZE * RenderWorker.SLOT_COUNT)
+        self.requests = Queue()
+        self.done = Queue()
+
+        self.free_slots = list(range(RenderWorker.SLOT_COUNT))
+        self.shown_slot = None
+        self.dropped_frames = 0
+
+        self.process = Process(
+            target=render_loop,
+            args=(self.memory, chr_rom, screen_mirroring, self.requests, self.done),
+            daemon=True
+        )
+        self.process.start()
+
+    def get_slot(self, slot_index: int) -> memoryview:
+        return self.memory.buf[slot_index * SLOT_SIZE: (slot_index + 1) * SLOT_SIZE]
+
+    def submit(self, ppu: PPU) -> bool:
+        """
+        hands a snapshot of the PPU over to the worker, returns False if it had to be dropped
+        """
+        if not self.free_slots:
+            self.dropped_frames += 1
+            return False
+
+        slot_index = self.free_slots.pop()
+        write_render_state(ppu, self.get_slot(slot_index))
+        self.requests.put(slot_index)
+        return True
+
+    def latest_frame(self):
+        """
+        returns the most recent frame rendered since the last call, or None if there's none
+        the frame stays valid until the next call
+        """
+        latest = None
+        while True:
+            try:
+                slot_index = self.done.get_nowait()
+            except Empty:
+                break
+
+            if latest is not None:
+                self.free_slots.append(latest)
+            latest = slot_index
+
+        if latest is None:
+            return None
+
+        if self.shown_slot is not None:
+            self.free_slots.append(self.shown_slot)
+        self.shown_slot = latest
+
+        return Frame(self.get_slot(latest)[FRAME_START:])
+
+    def close(self):
+        self.requests.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+        self.memory.unlink()
+        try:
+            self.memory.close()
+        except BufferError:
+            # a frame handed out by latest_frame is still referenced, the mapping goes away with it
+            pass
@@ -0,0 +1,82 @@
+import zlib
+from collections import deque
+from cpu import CPU
+from savestate import save_state, load_state
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+class RewindBuffer:
+    """
+    save states of the last moments of play, to step back through them
+
+    only the latest state is kept whole, every older one is stored as the zlib compressed XOR with the state
+    after it: consecutive states differ in a few hundred bytes, so the XOR is mostly zeros and compresses
+    to a small fraction of a state
+    the oldest states are dropped when the whole buffer goes over budget
+    """
+
+    def __init__(self, budget_mb: float = 16, interval: int = 2):
+        self.budget = int(budget_mb * 1024 * 1024)
+        # frames between two states
+        self.interval = interval
+        self.frame_count = 0
+
+        self.latest = None
+        # oldest first, deltas[-1] turns latest into the state before it
+        self.deltas = deque()
+        self.size = 0
+
+    def capture(self, cpu: CPU):
+        """
+        called once per frame, keeps a state every interval frames
+        """
+        self.frame_count += 1
+        if self.frame_count >= self.interval:
+            self.frame_count = 0
+            self.push(save_state(cpu))
+
+    def step_back(self, cpu: CPU) -> bool:
+        """
+        loads the latest state and makes the one before it the latest, returns False when there's none
+        holding at the oldest state once everything older was used or dropped
+        """
+        state = self.pop()
+        if state is None:
+            return False
+
+        load_state(cpu, state)
+        self.frame_count = 0
+        return True
+
+    def push(self, state: bytes):
+        if self.latest is not None and len(self.latest) == len(state):
+            delta = zlib.compress(xor_bytes(state, self.latest), 1)
+            self.deltas.append(delta)
+            self.size += len(delta)
+        else:
+            self.clear()
+
+        self.latest = state
+
+        while self.deltas and self.size + len(self.latest) > self.budget:
+            self.size -= len(self.deltas.popleft())
+
+    def pop(self):
+        state = self.latest
+        if self.deltas:
+            delta = self.deltas.pop()
+            self.size -= len(delta)
+            self.latest = xor_bytes(self.latest, zlib.decompress(delta))
+
+        return state
+
+    def clear(self):
+        self.latest = None
+        self.deltas.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.deltas) + (self.latest is not None)
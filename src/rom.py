@@ -1,4 +1,5 @@
 from memory_owner import MemoryOwner
+from ppu.mirroring import Mirroring
 
 KB_SIZE = 1024
 
@@ -14,11 +15,14 @@ class ROM(MemoryOwner):
         self.num_chr_rom_blocks = self.rom_bytes[5]
 
         control_byte_1 = self.rom_bytes[6]
-        self.screen_mirroring = control_byte_1 & 1
+        self.screen_mirroring = control_byte_1 & 1  # 0: horizontal - 1: vertical
         self.battery_ram = control_byte_1 & 0b10
         self.contains_trainer = control_byte_1 & 0b100
         self.four_screen_layout = control_byte_1 & 0b1000
 
+        if self.four_screen_layout:
+            self.screen_mirroring = Mirroring.FOUR_SCREEN
+
         control_byte_2 = self.rom_bytes[7]
         # bits 0 and 1 should be 0 for ines 1.0
         self.ines_version = control_byte_2 & 0b1100
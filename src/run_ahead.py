@@ -0,0 +1,67 @@
+from cpu import CPU
+from savestate import save_state, load_state
+
+
+class RunAhead:
+    """
+    hides the frames a game takes to react to its input
+
+    at every rendered frame the emulation is saved, run frames ahead with the input just read, rendered,
+    and loaded back: what's shown is the frame the game would draw frames later, while the game itself
+    only moves on one frame
+    the frames run ahead don't read input, make sound or reach the frontend
+    """
+
+    def __init__(self, cpu: CPU, frames: int = 1):
+        self.cpu = cpu
+        self.frames = frames
+        self.remaining = 0
+        self.render = None
+        self.frame = None
+
+    def run(self, render):
+        """
+        called at vblank instead of render, returns what render returns at the last frame ahead
+        """
+        cpu = self.cpu
+        bus = cpu.bus
+        apu = bus.apu
+
+        state = save_state(cpu)
+        callbacks = bus.update_ui_callback, bus.joystick_input_callback
+        synthesize = apu.synthesize
+        # a stop asked for earlier in this vblank still holds once the run ahead is over
+        running = cpu.running
+
+        bus.update_ui_callback = self.frame_ahead
+        bus.joystick_input_callback = self.skip_input
+        apu.synthesize = False
+        self.remaining = self.frames
+        self.render = render
+        self.frame = None
+
+        try:
+            # stops at the vblank of the last frame ahead, see frame_ahead
+            cpu.running = True
+            cpu.run()
+            frame = self.frame
+        finally:
+            bus.update_ui_callback, bus.joystick_input_callback = callbacks
+            apu.synthesize = synthesize
+            load_state(cpu, state)
+            cpu.running = running
+            # frames of the render worker are views of its shared memory, nothing here may keep one
+            self.render = None
+            self.frame = None
+
+        return frame
+
+    def frame_ahead(self):
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.frame = self.render()
+            self.cpu.running = False
+
+    def skip_input(self):
+        # the joypads keep the input of the frame being run ahead from
+        pass
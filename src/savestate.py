@@ -0,0 +1,271 @@
+"""
+binary save states with a fixed layout, every section is a struct or a raw buffer of known size:
+
+header, CPU, RAM (2KB), PPU registers, palette (32), OAM (256), VRAM (2KB, 4KB with four screen),
+joypads, APU, mapper (nothing for NROM)
+
+the ROM itself isn't saved, only its CRC32 so a state can't be loaded into another game
+the samples of the frame being synthesized aren't saved either, a loaded state starts a new audio frame
+"""
+import struct
+import zlib
+from hashlib import blake2b
+from apu import APU, Envelope, Channel, Triangle, Noise, DMC
+from cpu import CPU
+from io_registers import IO_Registers
+from ppu.ppu import PPU
+
+
+STATE_MAGIC = b'PNST'
+STATE_VERSION = 1
+
+# magic, version, mapper, ROM CRC32
+HEADER = struct.Struct('<4sBBI')
+# pc, sp, a, x, y, p, cycle, instruction count
+CPU_STATE = struct.Struct('<HBBBBBqq')
+# control, mask, status, oam address, oam data, address high and low, address latch, data buffer,
+# scroll x and y, scroll latch, mirroring, nmi, clock, scanline, cycle in the scanline, sprite 0 hit clock
+PPU_STATE = struct.Struct('<BBBBBBBBBBBBBBqHHq')
+# strobe, button index, button status
+JOYPAD_STATE = struct.Struct('<BBB')
+# cycle, five step, irq inhibit, frame interrupt, frame sequence start, frame step, sample cycle
+APU_STATE = struct.Struct('<qBBBqBd')
+# enabled, halt, length counter, timer period, phase, phase cycle
+CHANNEL_STATE = struct.Struct('<BBBHdq')
+# loop, constant volume, volume, start, divider, decay
+ENVELOPE_STATE = struct.Struct('<BBBBBB')
+# duty, sweep enabled, sweep period, sweep negate, sweep shift, sweep reload, sweep divider
+PULSE_STATE = struct.Struct('<BBBBBBB')
+# linear counter, linear reload value, linear reload
+TRIANGLE_STATE = struct.Struct('<BBB')
+# short mode
+NOISE_STATE = struct.Struct('<B')
+# irq enabled, loop, rate, level, sample address, sample length, address, bytes remaining,
+# buffer (-1 when empty), shift, bits remaining, silence, timer cycle, interrupt
+DMC_STATE = struct.Struct('<BBHBHHHHhBBBqB')
+# control, mask, status, scroll x and y, ppu clock, apu cycle, frame step, dmc address and bytes remaining
+HASHED_COUNTERS = struct.Struct('<BBBBBqqBHH')
+
+
+class StateError(Exception):
+    pass
+
+
+def rom_checksum(cpu: CPU) -> int:
+    return zlib.crc32(cpu.bus.rom.rom_bytes)
+
+
+def save_state(cpu: CPU) -> bytes:
+    bus = cpu.bus
+    ppu: PPU = bus.ppu
+    io_regs: IO_Registers = bus.io_regs
+
+    sections = [
+        HEADER.pack(STATE_MAGIC, STATE_VERSION, bus.rom.rom_mapper_type, rom_checksum(cpu)),
+        CPU_STATE.pack(cpu.pc_reg, cpu.sp_reg & 0xFF, cpu.a_reg, cpu.x_reg, cpu.y_reg, cpu.status_reg.to_int(),
+                       cpu.cycle, cpu.instruction_count),
+        bytes(bus.ram.memory),
+        PPU_STATE.pack(
+            ppu.control_reg.value, ppu.mask_reg.value, ppu.status_reg.value, ppu.oam_address_reg, ppu.oam_data_reg,
+            ppu.addr_reg[0], ppu.addr_reg[1], ppu.addr_reg_pointer, ppu.internal_data_buf,
+            ppu.scroll_reg[0], ppu.scroll_reg[1], ppu.scroll_reg_pointer, ppu.mirror_mode, ppu.nmi_interrupt,
+            ppu.clock, ppu.scanline, ppu.current_cycle,
+            -1 if ppu.sprite_0_hit_clock is None else ppu.sprite_0_hit_clock
+        ),
+        bytes(ppu.palette_table),
+        bytes(ppu.oam_data),
+        bytes(ppu.ram)
+    ]
+
+    for joypad in (io_regs.joypad1, io_regs.joypad2):
+        sections.append(JOYPAD_STATE.pack(joypad.strobe, joypad.button_index, joypad.button_status))
+
+    sections.append(save_apu(io_regs.apu))
+
+    # NROM has no banks or registers, mappers that do append theirs here
+    return b''.join(sections)
+
+
+def state_hash(cpu: CPU, digest_size: int = 16) -> bytes:
+    """
+    hash of the CPU registers, RAM, VRAM, OAM, palette and the PPU and APU counters, equal for machines in lockstep
+    it goes straight over the buffers without making a state, cheap enough to compare replays every frame
+    """
+    bus = cpu.bus
+    ppu: PPU = bus.ppu
+    apu: APU = bus.apu
+
+    digest = blake2b(CPU_STATE.pack(cpu.pc_reg, cpu.sp_reg & 0xFF, cpu.a_reg, cpu.x_reg, cpu.y_reg,
+                                    cpu.status_reg.to_int(), cpu.cycle, cpu.instruction_count),
+                     digest_size=digest_size)
+    digest.update(bus.ram.memory)
+    digest.update(bytes(ppu.ram))
+    digest.update(bytes(ppu.oam_data))
+    digest.update(bytes(ppu.palette_table))
+    digest.update(HASHED_COUNTERS.pack(ppu.control_reg.value, ppu.mask_reg.value, ppu.status_reg.value,
+                                       ppu.scroll_reg[0], ppu.scroll_reg[1], ppu.clock, apu.cycle, apu.frame_step,
+                                       apu.dmc.address, apu.dmc.bytes_remaining))
+    return digest.digest()
+
+
+def save_apu(apu: APU) -> bytes:
+    sections = [APU_STATE.pack(apu.cycle, apu.five_step, apu.irq_inhibit, apu.frame_interrupt,
+                               apu.frame_sequence_start, apu.frame_step, apu.sample_cycle)]
+
+    for channel in apu.channels:
+        sections.append(save_channel(channel))
+
+    for pulse in (apu.pulse1, apu.pulse2):
+        sections.append(PULSE_STATE.pack(pulse.duty, pulse.sweep_enabled, pulse.sweep_period, pulse.sweep_negate,
+                                         pulse.sweep_shift, pulse.sweep_reload, pulse.sweep_divider))
+        sections.append(save_envelope(pulse.envelope))
+
+    triangle = apu.triangle
+    sections.append(TRIANGLE_STATE.pack(triangle.linear_counter, triangle.linear_reload_value,
+                                        triangle.linear_reload))
+    sections.append(NOISE_STATE.pack(apu.noise.short_mode))
+    sections.append(save_envelope(apu.noise.envelope))
+
+    dmc = apu.dmc
+    sections.append(DMC_STATE.pack(
+        dmc.irq_enabled, dmc.loop, dmc.rate, dmc.level, dmc.sample_address, dmc.sample_length, dmc.address,
+        dmc.bytes_remaining, -1 if dmc.buffer is None else dmc.buffer, dmc.shift, dmc.bits_remaining, dmc.silence,
+        dmc.timer_cycle, dmc.interrupt
+    ))
+
+    return b''.join(sections)
+
+
+def save_channel(channel: Channel) -> bytes:
+    return CHANNEL_STATE.pack(channel.enabled, channel.halt, channel.length_counter, channel.timer_period,
+                              channel.phase, channel.phase_cycle)
+
+
+def save_envelope(envelope: Envelope) -> bytes:
+    return ENVELOPE_STATE.pack(envelope.loop, envelope.constant_volume, envelope.volume, envelope.start,
+                               envelope.divider, envelope.decay)
+
+
+class StateReader:
+    """
+    reads the sections of a state in order
+    """
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        if self.offset + layout.size > len(self.data):
+            raise StateError('State is truncated')
+
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def read(self, size: int) -> bytes:
+        if self.offset + size > len(self.data):
+            raise StateError('State is truncated')
+
+        data = self.data[self.offset: self.offset + size]
+        self.offset += size
+        return bytes(data)
+
+
+def load_state(cpu: CPU, data: bytes):
+    bus = cpu.bus
+    ppu: PPU = bus.ppu
+    io_regs: IO_Registers = bus.io_regs
+    reader = StateReader(data)
+
+    magic, version, mapper, checksum = reader.unpack(HEADER)
+    if magic != STATE_MAGIC:
+        raise StateError('Not a save state')
+    if version != STATE_VERSION:
+        raise StateError('Save state version not supported', version)
+    if mapper != bus.rom.rom_mapper_type or checksum != rom_checksum(cpu):
+        raise StateError('Save state is from another ROM')
+
+    cpu.pc_reg, cpu.sp_reg, cpu.a_reg, cpu.x_reg, cpu.y_reg, status, cpu.cycle, cpu.instruction_count = \
+        reader.unpack(CPU_STATE)
+    cpu.status_reg.from_int(status)
+
+    bus.ram.memory[:] = reader.read(len(bus.ram.memory))
+
+    (control, mask, ppu_status, ppu.oam_address_reg, ppu.oam_data_reg, address_high, address_low,
+     ppu.addr_reg_pointer, ppu.internal_data_buf, scroll_x, scroll_y, ppu.scroll_reg_pointer, mirror_mode,
+     nmi_interrupt, ppu.clock, ppu.scanline, ppu.current_cycle, sprite_0_hit_clock) = reader.unpack(PPU_STATE)
+    ppu.control_reg.from_int(control)
+    ppu.mask_reg.from_int(mask)
+    ppu.status_reg.from_int(ppu_status)
+    ppu.addr_reg = [address_high, address_low]
+    ppu.scroll_reg = [scroll_x, scroll_y]
+    ppu.set_mirroring(mirror_mode)
+    ppu.nmi_interrupt = bool(nmi_interrupt)
+    ppu.sprite_0_hit_clock = None if sprite_0_hit_clock < 0 else sprite_0_hit_clock
+
+    ppu.palette_table = list(reader.read(len(ppu.palette_table)))
+    ppu.oam_data = list(reader.read(len(ppu.oam_data)))
+    ppu.ram = list(reader.read(len(ppu.ram)))
+
+    for joypad in (io_regs.joypad1, io_regs.joypad2):
+        joypad.strobe, joypad.button_index, joypad.button_status = reader.unpack(JOYPAD_STATE)
+
+    load_apu(io_regs.apu, reader)
+
+    # the next event depends on everything above
+    bus.schedule()
+
+
+def load_apu(apu: APU, reader: StateReader):
+    (apu.cycle, five_step, irq_inhibit, frame_interrupt, apu.frame_sequence_start, apu.frame_step,
+     apu.sample_cycle) = reader.unpack(APU_STATE)
+    apu.five_step = bool(five_step)
+    apu.irq_inhibit = bool(irq_inhibit)
+    apu.frame_interrupt = bool(frame_interrupt)
+
+    for channel in apu.channels:
+        load_channel(channel, reader)
+
+    for pulse in (apu.pulse1, apu.pulse2):
+        (pulse.duty, sweep_enabled, pulse.sweep_period, sweep_negate, pulse.sweep_shift, sweep_reload,
+         pulse.sweep_divider) = reader.unpack(PULSE_STATE)
+        pulse.sweep_enabled = bool(sweep_enabled)
+        pulse.sweep_negate = bool(sweep_negate)
+        pulse.sweep_reload = bool(sweep_reload)
+        load_envelope(pulse.envelope, reader)
+
+    triangle: Triangle = apu.triangle
+    triangle.linear_counter, triangle.linear_reload_value, linear_reload = reader.unpack(TRIANGLE_STATE)
+    triangle.linear_reload = bool(linear_reload)
+
+    noise: Noise = apu.noise
+    noise.short_mode = bool(reader.unpack(NOISE_STATE)[0])
+    load_envelope(noise.envelope, reader)
+
+    dmc: DMC = apu.dmc
+    (irq_enabled, loop, dmc.rate, dmc.level, dmc.sample_address, dmc.sample_length, dmc.address,
+     dmc.bytes_remaining, buffer, dmc.shift, dmc.bits_remaining, silence, dmc.timer_cycle,
+     interrupt) = reader.unpack(DMC_STATE)
+    dmc.irq_enabled = bool(irq_enabled)
+    dmc.loop = bool(loop)
+    dmc.buffer = None if buffer < 0 else buffer
+    dmc.silence = bool(silence)
+    dmc.interrupt = bool(interrupt)
+
+    # the changes logged for the current audio frame belong to the old state
+    apu.start_frame(apu.cycle)
+
+
+def load_channel(channel: Channel, reader: StateReader):
+    enabled, halt, channel.length_counter, channel.timer_period, channel.phase, channel.phase_cycle = \
+        reader.unpack(CHANNEL_STATE)
+    channel.enabled = bool(enabled)
+    channel.halt = bool(halt)
+
+
+def load_envelope(envelope: Envelope, reader: StateReader):
+    loop, constant_volume, envelope.volume, start, envelope.divider, envelope.decay = reader.unpack(ENVELOPE_STATE)
+    envelope.loop = bool(loop)
+    envelope.constant_volume = bool(constant_volume)
+    envelope.start = bool(start)
@@ -1,90 +1,99 @@
 import pygame
-from time import time_ns
 import sys
+import time
 from frame import Frame
+from frontend import Frontend
 from io_registers import IO_Registers
-from joypad import Joypad
+from keymap import Keymap
+from metrics import Metrics
 from ppu.ppu import PPU
 from cpu import CPU
+from pacing import FramePacer, FastForward
+from render_worker import RenderWorker
+from run_ahead import RunAhead
+from rewind import RewindBuffer
 
 PIXEL_SCALE = 4
+SCREENSHOT_KEY = pygame.K_F12
+REWIND_KEY = pygame.K_BACKSPACE
+FAST_FORWARD_KEY = pygame.K_TAB
 size = width, height = 256 * PIXEL_SCALE, 240 * PIXEL_SCALE
 
 
-class UI:
-    def __init__(self, ppu: PPU, io_regs: IO_Registers, cpu: CPU):
-        self.io_regs = io_regs
-        self.ppu = ppu
-        self.cpu = cpu
-        self.frame = Frame()
+class UI(Frontend):
+    def __init__(self, ppu: PPU, io_regs: IO_Registers, cpu: CPU, pacer: FramePacer = None,
+                 render_worker: RenderWorker = None, metrics: Metrics = None, overlay: bool = False,
+                 recorders: list = None, keymap: Keymap = None, rewind: RewindBuffer = None,
+                 fast_forward: FastForward = None, run_ahead: RunAhead = None):
+        super().__init__(ppu, io_regs, cpu, pacer=pacer, render_worker=render_worker, metrics=metrics,
+                         recorders=recorders, fast_forward=fast_forward, run_ahead=run_ahead)
+        self.overlay_font = None
+        self.keymap = keymap or Keymap()
+        self.rewind = rewind
         self.screen = pygame.display.set_mode(size)
-        self.square = pygame.Surface((PIXEL_SCALE, PIXEL_SCALE))
-        self.update_ui_callback = self.update_ui
-        self.last_frame_time = time_ns()
 
-        pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP])
+        # the frame is copied as is into an 8 bit surface at native resolution, its palette does the colors
+        self.native_surface = pygame.Surface((Frame.WIDTH, Frame.HEIGHT), depth=8)
+        self.native_surface.set_palette(PPU.SYSTEM_PALLETE * 4)  # palette values above $3F repeat it
+        # same format as the window so the scaled copy can go straight into it
+        self.rgb_surface = pygame.Surface((Frame.WIDTH, Frame.HEIGHT)).convert(self.screen)
 
-    def update_ui(self):
-        ppu_time = time_ns()
-        self.ppu.render(self.frame)
-        print("PPU:", (time_ns() - ppu_time) / 10**9)
+        if overlay and metrics is not None:
+            pygame.font.init()
+            self.overlay_font = pygame.font.Font(None, 24)
 
-        screen_time = time_ns()
+        self.keymap.open_joysticks()
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN])
 
-        for pixel in self.frame.pixels_to_update:
-            x = pixel[0]
-            y = pixel[1]
-            new_color = pixel[2]
-            draw = pygame.Rect((x * PIXEL_SCALE) + 1, (y * PIXEL_SCALE) + 1, PIXEL_SCALE, PIXEL_SCALE)
-            pygame.draw.rect(self.screen, new_color, draw)
+    def present(self, frame: Frame):
+        # constant cost no matter how many pixels changed: one copy, one palette blit and one scale
+        self.native_surface.get_buffer().write(bytes(frame.data))
+        self.rgb_surface.blit(self.native_surface, (0, 0))
+        pygame.transform.scale(self.rgb_surface, size, self.screen)
 
-        pygame.display.update()
+        if self.overlay_font is not None:
+            self.draw_overlay()
 
-        current_time = time_ns()
-        diff = current_time - self.last_frame_time
-        self.last_frame_time = current_time
-        print("update screen total time: {}".format((current_time - screen_time) / 10**9))
-        print("FPS: {}. Time since last frame: {}".format(10**9 / diff, diff / 10**9))
+        pygame.display.flip()
+
+    def draw_overlay(self):
+        summary = self.metrics.summary()
+        text = 'FPS {:.1f}  CPU {:.1f}ms  PPU {:.1f}ms  present {:.1f}ms  skipped {}'.format(
+            summary['fps'],
+            summary['cpu_ms'],
+            summary['render_ms'],
+            summary['present_ms'],
+            summary['skipped_frames']
+        )
+        self.screen.blit(self.overlay_font.render(text, True, (255, 255, 255), (0, 0, 0)), (4, 4))
 
     def handle_joystick_input(self):
+        # only quit and key presses are queued, key and joystick state is read once per frame from the keymap
         for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.UP
-                elif event.key == pygame.K_LEFT:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.LEFT
-                elif event.key == pygame.K_DOWN:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.DOWN
-                elif event.key == pygame.K_RIGHT:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.RIGHT
-                elif event.key == pygame.K_z:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.BUTTON_A
-                elif event.key == pygame.K_x:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.BUTTON_B
-                elif event.key == pygame.K_a:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.START
-                elif event.key == pygame.K_s:
-                    self.io_regs.joypad1.button_status |= Joypad.JoypadButton.SELECT
-
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_UP:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.UP
-                elif event.key == pygame.K_LEFT:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.LEFT
-                elif event.key == pygame.K_DOWN:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.DOWN
-                elif event.key == pygame.K_RIGHT:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.RIGHT
-                elif event.key == pygame.K_z:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.BUTTON_A
-                elif event.key == pygame.K_x:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.BUTTON_B
-                elif event.key == pygame.K_a:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.START
-                elif event.key == pygame.K_s:
-                    self.io_regs.joypad1.button_status &= 0xFF - Joypad.JoypadButton.SELECT
-
+            if event.type == pygame.KEYDOWN and event.key == SCREENSHOT_KEY:
+                self.save_screenshot()
+            elif event.type == pygame.KEYDOWN and event.key == FAST_FORWARD_KEY:
+                self.fast_forward.toggle()
             elif event.type == pygame.QUIT:
                 self.cpu.running = False
                 sys.exit()
-        
\ No newline at end of file
+
+        if self.rewind is not None:
+            # while the key is held every frame goes back one state instead of reading the joypads
+            if pygame.key.get_pressed()[REWIND_KEY] and self.rewind.step_back(self.cpu):
+                return
+            self.rewind.capture(self.cpu)
+
+        self.io_regs.joypad1.button_status, self.io_regs.joypad2.button_status = self.keymap.sample()
+
+    def save_screenshot(self) -> str:
+        """
+        writes the frame on screen as a PNG in the working directory, returns its path
+        """
+        if self.last_frame is None:
+            return ''
+
+        path = time.strftime('screenshot_%Y%m%d_%H%M%S_{}.png').format(self.cpu.instruction_count)
+        self.last_frame.save_png(path)
+        return path